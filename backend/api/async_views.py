@@ -0,0 +1,69 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='db'
+)
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет синхронную вьюху в потоке пула.
+
+    Ответ рендерится здесь же, чтобы кодирование JSON не занимало
+    цикл событий. Соединения потока закрываются по тем же правилам
+    CONN_MAX_AGE, что и при обработке запроса через WSGI.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Превращает синхронную вьюху в асинхронную.
+
+    Вьюха выполняется в ограниченном пуле ASYNC_DB_THREADS, поэтому
+    число одновременных запросов к БД от процесса не превышает размер
+    пула, а ожидание ответа не занимает поток сервера. Без настройки
+    ASYNC_VIEWS вьюха возвращается без изменений.
+    """
+    if not settings.ASYNC_VIEWS:
+        return view
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor,
+            functools.partial(
+                context.run, call_view, view, request, *args, **kwargs
+            ),
+        )
+
+    return wrapper
+
+
+class AsyncViewSetMixin:
+    """Миксин вьюсета, обслуживающий async_actions асинхронно.
+
+    Асинхронными становятся маршруты, в которые входит хотя бы одно
+    из действий async_actions, вместе с остальными методами маршрута.
+    """
+
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if set(actions.values()) & set(cls.async_actions):
+            return async_view(view)
+        return view
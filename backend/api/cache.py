@@ -0,0 +1,170 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'version:{}'
+RECIPES_VERSION = 'recipes'
+INGREDIENTS_VERSION = 'ingredients'
+
+
+def recipe_version(recipe_id):
+    """Имя счетчика версий рецепта."""
+    return f'recipe:{recipe_id}'
+
+
+def author_version(author_id):
+    """Имя счетчика версий автора."""
+    return f'author:{author_id}'
+
+
+def get_versions(*names):
+    """Возвращает текущие значения счетчиков версий.
+
+    Отсутствующий в кеше счетчик получает начальное значение по времени,
+    чтобы не совпасть с версиями записей, сохраненных до его вытеснения.
+    """
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key)
+    return [versions[VERSION_KEY.format(name)] for name in names]
+
+
+def increment_versions(names):
+    """Увеличивает счетчики версий, делая связанные записи устаревшими."""
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_versions(*names):
+    """Увеличивает счетчики версий после фиксации текущей транзакции.
+
+    До фиксации другие соединения читают старые строки, и новая версия
+    позволила бы закешировать их под новым ключом. Вне транзакции
+    счетчики увеличиваются сразу.
+    """
+    transaction.on_commit(lambda: increment_versions(names))
+
+
+def bump_recipe(recipe):
+    """Отмечает изменение рецепта."""
+    bump_versions(RECIPES_VERSION, recipe_version(recipe.id))
+
+
+def bump_author(author):
+    """Отмечает изменение данных автора, встроенных в рецепты."""
+    bump_versions(RECIPES_VERSION, author_version(author.id))
+
+
+def bump_ingredients():
+    """Отмечает изменение справочника ингредиентов."""
+    bump_versions(INGREDIENTS_VERSION)
+
+
+def make_etag(*parts):
+    """Строит ETag из частей ключа кеша."""
+    return '"{}"'.format(
+        hashlib.md5(':'.join(map(str, parts)).encode('utf-8')).hexdigest()
+    )
+
+
+class AnonymousCacheMixin:
+    """Кеширует ответы list и retrieve для анонимных пользователей.
+
+    Ключ кеша включает параметры запроса и счетчики версий, поэтому
+    запись рецепта или автора делает устаревшими связанные ответы
+    без явного удаления. Поддерживаются ETag и If-None-Match.
+    """
+
+    cache_prefix = 'response'
+
+    def is_cacheable(self, request):
+        """Кешируются только ответы анонимным пользователям."""
+        return not request.user.is_authenticated
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список из кеша, ключ зависит от версии рецептов."""
+        if not self.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        params = sorted(request.query_params.lists())
+        key = ':'.join(map(str, (
+            self.cache_prefix,
+            'list',
+            *get_versions(RECIPES_VERSION, INGREDIENTS_VERSION),
+            hashlib.md5(
+                f'{request.get_host()}{params}'.encode('utf-8')
+            ).hexdigest(),
+        )))
+        etag = make_etag(key)
+        if self.is_not_modified(request, etag):
+            return self.not_modified_response(etag)
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return self.cached_response(data, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает объект из кеша с проверкой версии автора."""
+        if not self.is_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = ':'.join(map(str, (
+            self.cache_prefix,
+            'detail',
+            pk,
+            *get_versions(recipe_version(pk), INGREDIENTS_VERSION),
+            request.get_host(),
+        )))
+        entry = cache.get(key)
+        if entry is not None:
+            author_id, version, data = entry
+            if get_versions(author_version(author_id)) == [version]:
+                etag = make_etag(key, version)
+                if self.is_not_modified(request, etag):
+                    return self.not_modified_response(etag)
+                return self.cached_response(data, etag)
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        author_id = response.data['author']['id']
+        version, = get_versions(author_version(author_id))
+        cache.set(
+            key,
+            (author_id, version, response.data),
+            settings.RESPONSE_CACHE_TIMEOUT,
+        )
+        return self.cached_response(response.data, make_etag(key, version))
+
+    def is_not_modified(self, request, etag):
+        """Проверяет, совпадает ли ETag с заголовком If-None-Match."""
+        return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+    def not_modified_response(self, etag):
+        """Возвращает ответ 304 без тела."""
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_response(self, data, etag):
+        """Возвращает ответ с данными из кеша."""
+        response = Response(data)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Предупреждает, если счетчики версий хранятся в памяти процесса."""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Warning(
+            'Кеш по умолчанию не является общим для процессов.',
+            hint=(
+                'Задайте CACHE_BACKEND и CACHE_LOCATION общего кеша, '
+                'например memcached. Иначе изменения рецептов '
+                'и ингредиентов не доходят до других процессов '
+                'и обработчика очереди.'
+            ),
+            id='api.W001',
+        )
+    ]
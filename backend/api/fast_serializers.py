@@ -0,0 +1,247 @@
+import threading
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.permissions import SAFE_METHODS
+
+from api.metrics import serializer_timer
+
+SKIP = object()
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+)
+
+plans = {}
+plans_lock = threading.Lock()
+
+
+def resolve(instance, attrs):
+    """Достает значение по пути source так же, как Field.get_attribute.
+
+    Поддерживаются и объекты моделей, и строки .values().
+    """
+    for attr in attrs:
+        try:
+            if isinstance(instance, Mapping):
+                instance = instance[attr]
+            else:
+                instance = getattr(instance, attr)
+        except ObjectDoesNotExist:
+            return None
+        if instance is None:
+            return None
+    return instance
+
+
+def file_url(value, request):
+    """Ссылка на файл так же, как FileField.to_representation."""
+    if not value:
+        return None
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class DumpScope:
+    """Контекст одного вывода: запрос и экземпляры сериализаторов.
+
+    Экземпляр сериализатора нужен для SerializerMethodField и создается
+    один раз на вывод, без разбора полей.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.request = context.get('request')
+        self.serializers = {}
+
+    def serializer(self, plan):
+        serializer = self.serializers.get(plan)
+        if serializer is None:
+            serializer = plan.serializer_class(context=self.context)
+            self.serializers[plan] = serializer
+        return serializer
+
+
+class SerializerPlan:
+    """Заранее разобранный сериализатор для быстрого вывода данных.
+
+    Поля сериализатора один раз превращаются в список шагов
+    (имя, функция), и объект выводится в словарь вызовом этих функций
+    без механизма полей DRF. Вывод совпадает с to_representation:
+    простые поля берутся как есть, ссылки на файлы строятся так же,
+    как в FileField, методы вызываются у экземпляра сериализатора,
+    а вложенные сериализаторы выводятся своими планами. Собственные
+    поля выводятся методом represent(instance, request), если он есть.
+    Если у сериализатора есть метод prime, он вызывается для списка
+    объектов.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.lock = threading.Lock()
+        self.compiled = None
+
+    @property
+    def steps(self):
+        if self.compiled is None:
+            with self.lock:
+                if self.compiled is None:
+                    self.compiled = self.compile()
+        return self.compiled
+
+    def compile(self):
+        """Разбирает поля сериализатора в шаги вывода."""
+        return [
+            (name, self.compile_field(field))
+            for name, field in self.serializer_class().fields.items()
+            if not field.write_only
+        ]
+
+    def compile_field(self, field):
+        """Возвращает функцию (объект, контекст вывода) -> значение."""
+        attrs = field.source_attrs
+        if isinstance(field, serializers.ListSerializer):
+            child = get_plan(type(field.child))
+
+            def step(instance, scope):
+                value = resolve(instance, attrs)
+                if value is None:
+                    return None
+                if isinstance(value, models.Manager):
+                    value = value.all()
+                return child.dump_many(value, scope)
+        elif isinstance(field, serializers.BaseSerializer):
+            child = get_plan(type(field))
+
+            def step(instance, scope):
+                value = resolve(instance, attrs)
+                return None if value is None else child.dump(value, scope)
+        elif isinstance(field, serializers.SerializerMethodField):
+            method_name = field.method_name
+
+            def step(instance, scope):
+                return getattr(scope.serializer(self), method_name)(instance)
+        elif hasattr(field, 'represent'):
+            def step(instance, scope):
+                return field.represent(instance, scope.request)
+        elif isinstance(field, serializers.FileField):
+            def step(instance, scope):
+                return file_url(resolve(instance, attrs), scope.request)
+        else:
+            convert = (
+                None if isinstance(field, IDENTITY_FIELDS)
+                else field.to_representation
+            )
+            default = field.default
+            required = field.required
+
+            def step(instance, scope):
+                try:
+                    value = resolve(instance, attrs)
+                except (KeyError, AttributeError):
+                    if default is not empty:
+                        return default() if callable(default) else default
+                    if not required:
+                        return SKIP
+                    raise
+                if value is None or convert is None:
+                    return value
+                return convert(value)
+        return step
+
+    def dump(self, instance, scope):
+        """Выводит объект в словарь."""
+        data = {}
+        for name, step in self.steps:
+            value = step(instance, scope)
+            if value is not SKIP:
+                data[name] = value
+        return data
+
+    def dump_many(self, instances, scope):
+        """Выводит список объектов."""
+        instances = list(instances)
+        prime = getattr(scope.serializer(self), 'prime', None)
+        if prime is not None:
+            prime(instances)
+        return [self.dump(instance, scope) for instance in instances]
+
+
+def get_plan(serializer_class):
+    """Возвращает план сериализатора, создавая его при первом вызове."""
+    plan = plans.get(serializer_class)
+    if plan is None:
+        with plans_lock:
+            plan = plans.setdefault(
+                serializer_class, SerializerPlan(serializer_class)
+            )
+    return plan
+
+
+def dump(serializer_class, instance, context=None, many=False):
+    """Выводит объект или список объектов по плану сериализатора.
+
+    При выключенной настройке FAST_SERIALIZERS данные выводит
+    сериализатор DRF.
+    """
+    if not settings.FAST_SERIALIZERS:
+        return serializer_class(
+            instance, many=many, context=context or {}
+        ).data
+    plan = get_plan(serializer_class)
+    scope = DumpScope(context or {})
+    with serializer_timer():
+        if many:
+            return plan.dump_many(instance, scope)
+        return plan.dump(instance, scope)
+
+
+class FastSerializer:
+    """Замена сериализатора DRF для вывода данных по плану.
+
+    Поддерживает только чтение: атрибут data совпадает
+    с data сериализатора serializer_class.
+    """
+
+    def __init__(self, serializer_class, instance=None, many=False,
+                 context=None, **kwargs):
+        self.serializer_class = serializer_class
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @cached_property
+    def data(self):
+        return dump(
+            self.serializer_class, self.instance, self.context, self.many
+        )
+
+
+class FastSerializerMixin:
+    """Миксин вьюсета: ответы fast_actions выводятся по планам.
+
+    Действует для безопасных методов при включенной настройке
+    FAST_SERIALIZERS, остальные запросы обслуживает сериализатор DRF.
+    """
+
+    fast_actions = ('list', 'retrieve')
+
+    def get_serializer(self, *args, **kwargs):
+        if (
+            settings.FAST_SERIALIZERS
+            and self.action in self.fast_actions
+            and self.request.method in SAFE_METHODS
+            and (args or 'instance' in kwargs)
+        ):
+            kwargs.setdefault('context', self.get_serializer_context())
+            return FastSerializer(self.get_serializer_class(), *args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
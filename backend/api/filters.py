@@ -1,6 +1,10 @@
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, RecipeScore
+
+SCORE_ORDERINGS = ('popular', 'trending')
 
 
 class RecipeFilter(FilterSet):
@@ -10,10 +14,14 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in SCORE_ORDERINGS],
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'ordering')
 
     def get_authenticated_user(self):
         """Возвращает аутентифицированного пользователя, если он есть."""
@@ -35,6 +43,17 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_carts__user_id=user.id)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        """Сортирует рецепты по предрассчитанному рейтингу.
+
+        У рецептов, созданных пакетно, строки рейтинга может не быть,
+        они получают рейтинг по умолчанию, а не NULL.
+        """
+        default = RecipeScore._meta.get_field(value).default
+        return queryset.annotate(**{f'{value}_score': Coalesce(
+            F(f'score__{value}'), Value(default, output_field=FloatField())
+        )}).order_by(f'-{value}_score', '-id')
+
 
 class IngredientFilter(FilterSet):
     """Фильтры для ингредиентов."""
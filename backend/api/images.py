@@ -0,0 +1,129 @@
+import binascii
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFile, features
+
+from foodgram_backend.constants import (
+    BASE64_CHUNK_SIZE,
+    IMAGE_MAX_SIDE,
+    IMAGE_VARIANTS,
+)
+
+VARIANTS_DIR = 'variants'
+VARIANT_FORMAT, VARIANT_EXTENSION = (
+    ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+)
+
+
+class ImageDecodeError(ValueError):
+    """Ошибка декодирования изображения."""
+
+
+def decode_base64_image(data, name, max_side=IMAGE_MAX_SIDE):
+    """Декодирует base64 по частям во временный файл.
+
+    Размеры изображения проверяются по заголовку из первых
+    декодированных частей, до декодирования всего содержимого.
+    """
+    parser = ImageFile.Parser()
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    checked = False
+    try:
+        for start in range(0, len(data), BASE64_CHUNK_SIZE):
+            chunk = binascii.a2b_base64(
+                data[start:start + BASE64_CHUNK_SIZE]
+            )
+            output.write(chunk)
+            if checked:
+                continue
+            parser.feed(chunk)
+            if parser.image is not None:
+                width, height = parser.image.size
+                if max(width, height) > max_side:
+                    raise ImageDecodeError(
+                        f'Размер изображения не должен превышать '
+                        f'{max_side}px по большей стороне.'
+                    )
+                checked = True
+    except (binascii.Error, OSError) as error:
+        output.close()
+        raise ImageDecodeError('Некорректное изображение.') from error
+    except ImageDecodeError:
+        output.close()
+        raise
+    if not checked:
+        output.close()
+        raise ImageDecodeError('Некорректное изображение.')
+    output.seek(0)
+    return File(output, name=name)
+
+
+def variant_name(name, variant):
+    """Возвращает путь к уменьшенной копии изображения."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, VARIANTS_DIR, f'{stem}_{variant}.{VARIANT_EXTENSION}'
+    )
+
+
+def variant_urls(field_file, ready, request=None):
+    """Возвращает ссылки на уменьшенные копии изображения.
+
+    Пока копии не созданы фоновой задачей, возвращается ссылка
+    на оригинал. Ссылки строятся без обращения к хранилищу.
+    """
+    if not field_file:
+        return None
+    storage = field_file.storage
+    urls = {}
+    for variant in IMAGE_VARIANTS:
+        url = storage.url(
+            variant_name(field_file.name, variant) if ready
+            else field_file.name
+        )
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def variants_exist(name, storage):
+    """Проверяет, что все уменьшенные копии изображения есть в хранилище."""
+    return bool(name) and all(
+        storage.exists(variant_name(name, variant))
+        for variant in IMAGE_VARIANTS
+    )
+
+
+def generate_variants(field_file):
+    """Создает уменьшенные копии изображения в формате WebP или JPEG."""
+    if not field_file:
+        return
+    storage = field_file.storage
+    with storage.open(field_file.name) as source:
+        with Image.open(source) as original:
+            original.load()
+    if VARIANT_FORMAT == 'JPEG' and original.mode != 'RGB':
+        original = original.convert('RGB')
+    for variant, size in IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        buffer = BytesIO()
+        image.save(buffer, VARIANT_FORMAT, quality=settings.IMAGE_QUALITY)
+        name = variant_name(field_file.name, variant)
+        storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_variants(name, storage):
+    """Удаляет уменьшенные копии изображения."""
+    if not name:
+        return
+    for variant in IMAGE_VARIANTS:
+        storage.delete(variant_name(name, variant))
@@ -0,0 +1,92 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from api.cache import INGREDIENTS_VERSION, get_versions
+from recipes.models import Ingredient
+
+CHECK_INTERVAL = 1
+
+
+class IngredientCatalog:
+    """Справочник ингредиентов id → (название, единица) в памяти процесса.
+
+    Идентификаторы хранятся в отсортированном массиве, названия
+    и единицы измерения — в кортежах с теми же позициями. Версия
+    справочника берется из общего кеша и проверяется не чаще раза
+    в CHECK_INTERVAL секунд, поэтому изменения в админке и загрузка
+    данных доходят до всех процессов.
+    """
+
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = None
+        self.checked = 0
+
+    def build(self, version=None):
+        """Загружает справочник из базы данных."""
+        if version is None:
+            version, = get_versions(INGREDIENTS_VERSION)
+        rows = list(
+            Ingredient.objects.order_by('id').values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        data = (
+            array('q', (row[0] for row in rows)),
+            tuple(row[1] for row in rows),
+            tuple(sys.intern(row[2]) for row in rows),
+        )
+        with self.lock:
+            self.data, self.version = data, version
+            self.checked = time.monotonic()
+        return data
+
+    def get_data(self):
+        """Возвращает актуальные массивы справочника."""
+        data = self.data
+        now = time.monotonic()
+        if data is not None and now - self.checked < self.check_interval:
+            return data
+        version, = get_versions(INGREDIENTS_VERSION)
+        if data is None or version != self.version:
+            return self.build(version)
+        self.checked = now
+        return data
+
+    def invalidate(self):
+        """Сбрасывает справочник, он будет загружен при обращении."""
+        with self.lock:
+            self.data = None
+
+    def get(self, ingredient_id):
+        """Возвращает (название, единица) или None."""
+        ids, names, units = self.get_data()
+        position = bisect_left(ids, ingredient_id)
+        if position < len(ids) and ids[position] == ingredient_id:
+            return names[position], units[position]
+        return None
+
+    def get_many(self, ingredient_ids):
+        """Возвращает словарь id → (название, единица) для известных id."""
+        found = {}
+        for ingredient_id in ingredient_ids:
+            value = self.get(ingredient_id)
+            if value is not None:
+                found[ingredient_id] = value
+        return found
+
+    def unknown(self, ingredient_ids):
+        """Возвращает id, которых нет в справочнике."""
+        return set(ingredient_ids) - self.get_many(ingredient_ids).keys()
+
+    def items(self):
+        """Возвращает кортежи (id, название, единица) в порядке id."""
+        return zip(*self.get_data())
+
+
+ingredient_catalog = IngredientCatalog()
@@ -0,0 +1,113 @@
+import json
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.db import DatabaseError, connections
+
+from api.ingredient_catalog import ingredient_catalog
+from foodgram_backend.constants import INGREDIENT_INDEX_RESPONSES_MAX
+
+PREFIX_END = '\U0010ffff'
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Названия хранятся в отсортированном по нижнему регистру массиве,
+    поиск выполняется двоичным поиском, готовые JSON-ответы кешируются
+    по паре (префикс, лимит). Индекс строится по справочнику
+    ingredient_catalog и перестраивается при смене его версии.
+    """
+
+    def __init__(self, max_responses=INGREDIENT_INDEX_RESPONSES_MAX):
+        self.max_responses = max_responses
+        self.lock = threading.Lock()
+        self.keys = None
+        self.items = None
+        self.source = None
+        self.generation = 0
+        self.responses = OrderedDict()
+
+    def build(self, source=None):
+        """Строит индекс по справочнику ингредиентов."""
+        generation = self.generation
+        source = source or ingredient_catalog.get_data()
+        rows = sorted(
+            (name.lower(), name, pk, measurement_unit)
+            for pk, name, measurement_unit in zip(*source)
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, name, pk, unit in rows
+        ]
+        with self.lock:
+            if generation == self.generation:
+                self.keys, self.items, self.source = keys, items, source
+        return keys, items
+
+    def check_source(self):
+        """Сбрасывает индекс, если изменился справочник."""
+        source = ingredient_catalog.get_data()
+        if source is not self.source:
+            self.invalidate()
+        return source
+
+    def invalidate(self):
+        """Сбрасывает индекс, он будет построен заново при обращении."""
+        with self.lock:
+            self.keys = None
+            self.items = None
+            self.source = None
+            self.generation += 1
+            self.responses.clear()
+
+    def search(self, prefix='', limit=None):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        source = self.check_source()
+        keys, items = self.keys, self.items
+        if keys is None:
+            keys, items = self.build(source)
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_END, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return items[start:end]
+
+    def render(self, prefix='', limit=None):
+        """Возвращает закодированный JSON-ответ для префикса."""
+        key = (prefix.lower(), limit)
+        self.check_source()
+        with self.lock:
+            generation = self.generation
+            content = self.responses.get(key)
+            if content is not None:
+                self.responses.move_to_end(key)
+                return content
+        content = json.dumps(
+            self.search(prefix, limit),
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ).encode('utf-8')
+        with self.lock:
+            if generation != self.generation:
+                return content
+            self.responses[key] = content
+            if len(self.responses) > self.max_responses:
+                self.responses.popitem(last=False)
+        return content
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def warm_up():
+    """Строит индекс при старте процесса, если база данных доступна."""
+    try:
+        ingredient_index.build()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from api.cache import VERSION_KEY, get_versions
+from recipes.models import RecipeIngredient
+
+MATCHER_VERSION = 'recipe_ingredients'
+CHANGE_KEY = 'recipe_ingredients:change:{}'
+CHANGE_TIMEOUT = 60 * 60
+CHANGES_MAX = 500
+
+
+class IngredientMatcher:
+    """Инвертированный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Для каждого ингредиента хранится множество рецептов, для каждого
+    рецепта — множество его ингредиентов. Подбор рецептов по набору
+    продуктов сводится к подсчету попаданий в списки рецептов.
+    Каждое изменение после фиксации транзакции публикуется в общем кеше
+    под очередным номером версии, другие процессы догоняют журнал
+    изменений, а если он слишком длинный или вытеснен из кеша — строят
+    индекс заново.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = None
+        self.recipes = None
+        self.version = None
+
+    def build(self):
+        """Загружает состав всех рецептов и строит индекс."""
+        version, = get_versions(MATCHER_VERSION)
+        postings = defaultdict(set)
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in (
+            RecipeIngredient.objects.order_by()
+            .values_list('recipe_id', 'ingredient_id')
+            .iterator()
+        ):
+            postings[ingredient_id].add(recipe_id)
+            recipes[recipe_id].add(ingredient_id)
+        with self.lock:
+            self.postings, self.recipes = postings, recipes
+            self.version = version
+
+    def ensure_fresh(self):
+        """Применяет изменения, сделанные другими процессами."""
+        version, = get_versions(MATCHER_VERSION)
+        local = self.version
+        if self.postings is None or local is None or version < local:
+            return self.build()
+        if version == local:
+            return
+        if version - local > CHANGES_MAX:
+            return self.build()
+        changes = cache.get_many([
+            CHANGE_KEY.format(number)
+            for number in range(local + 1, version + 1)
+        ])
+        if len(changes) != version - local:
+            return self.build()
+        recipe_ids = set(changes.values())
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        with self.lock:
+            if self.version != local:
+                return
+            for recipe_id in recipe_ids:
+                self.replace(recipe_id, ingredients[recipe_id])
+            self.version = version
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах после фиксации транзакции."""
+        transaction.on_commit(self.reset)
+
+    def reset(self):
+        """Сбрасывает индекс, меняя общую версию скачком."""
+        cache.set(
+            VERSION_KEY.format(MATCHER_VERSION), time.time_ns(), timeout=None
+        )
+        with self.lock:
+            self.postings = None
+
+    def update(self, recipe_id, ingredient_ids):
+        """Заменяет состав рецепта в индексе после фиксации транзакции."""
+        ingredient_ids = set(ingredient_ids)
+        transaction.on_commit(lambda: self.apply(recipe_id, ingredient_ids))
+
+    def remove(self, recipe_id):
+        """Удаляет рецепт из индекса после фиксации транзакции."""
+        self.update(recipe_id, ())
+
+    def replace(self, recipe_id, ingredient_ids):
+        """Заменяет множества рецепта, вызывается под блокировкой."""
+        if self.postings is None:
+            return
+        old = self.recipes.pop(recipe_id, set())
+        for ingredient_id in old - ingredient_ids:
+            self.postings[ingredient_id].discard(recipe_id)
+        for ingredient_id in ingredient_ids - old:
+            self.postings[ingredient_id].add(recipe_id)
+        if ingredient_ids:
+            self.recipes[recipe_id] = ingredient_ids
+
+    def apply(self, recipe_id, ingredient_ids):
+        """Применяет изменение локально и публикует его в журнал."""
+        get_versions(MATCHER_VERSION)
+        try:
+            version = cache.incr(VERSION_KEY.format(MATCHER_VERSION))
+        except ValueError:
+            return self.reset()
+        cache.set(CHANGE_KEY.format(version), recipe_id, CHANGE_TIMEOUT)
+        with self.lock:
+            self.replace(recipe_id, ingredient_ids)
+            if self.version == version - 1:
+                self.version = version
+
+    def match(self, ingredient_ids, max_missing=0):
+        """Возвращает рецепты, которым не хватает не более max_missing.
+
+        Результат — список пар (id рецепта, недостающие ингредиенты),
+        отсортированный по числу недостающих, затем по числу совпавших
+        ингредиентов и по новизне рецепта.
+        """
+        self.ensure_fresh()
+        with self.lock:
+            postings, recipes = self.postings, self.recipes
+            hits = Counter()
+            for ingredient_id in set(ingredient_ids):
+                hits.update(postings.get(ingredient_id, ()))
+            found = [
+                (len(recipes[recipe_id]) - count, -count, -recipe_id)
+                for recipe_id, count in hits.items()
+                if len(recipes[recipe_id]) - count <= max_missing
+            ]
+            found.sort()
+            wanted = set(ingredient_ids)
+            return [
+                (-recipe_id, sorted(recipes[-recipe_id] - wanted))
+                for _, _, recipe_id in found
+            ]
+
+
+recipe_matcher = IngredientMatcher()
@@ -0,0 +1,116 @@
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+LOADER_ATTRIBUTE = '_foodgram_loader'
+
+
+class RelationLoader:
+    """Пакетно проверяет наличие связей пользователя с объектами.
+
+    Идентификаторы объектов накапливаются, а при первом обращении
+    к результату все накопленные идентификаторы проверяются одним запросом.
+    """
+
+    def __init__(self, queryset, lookup, field):
+        self.queryset = queryset
+        self.lookup = lookup
+        self.field = field
+        self.pending = set()
+        self.resolved = {}
+
+    def prime(self, ids):
+        """Добавляет идентификаторы в очередь на проверку."""
+        self.pending.update(
+            obj_id for obj_id in ids if obj_id not in self.resolved
+        )
+
+    def load(self, obj_id):
+        """Возвращает наличие связи для объекта с указанным id."""
+        if obj_id not in self.resolved:
+            self.pending.add(obj_id)
+            self.dispatch()
+        return self.resolved[obj_id]
+
+    def dispatch(self):
+        """Проверяет все накопленные идентификаторы одним запросом."""
+        ids = self.pending
+        self.pending = set()
+        found = set(
+            self.queryset.filter(
+                **{f'{self.lookup}__in': ids}
+            ).values_list(self.field, flat=True)
+        )
+        self.resolved.update((obj_id, obj_id in found) for obj_id in ids)
+
+
+class RequestLoader:
+    """Загрузчик флагов пользователя в рамках одного запроса."""
+
+    def __init__(self, user):
+        self.user = user if user and user.is_authenticated else None
+        if self.user is None:
+            return
+        self.favorites = RelationLoader(
+            Favorite.objects.filter(user=self.user), 'recipe_id', 'recipe_id'
+        )
+        self.shopping_carts = RelationLoader(
+            ShoppingCart.objects.filter(user=self.user),
+            'recipe_id',
+            'recipe_id',
+        )
+        self.subscriptions = RelationLoader(
+            Subscription.objects.filter(subscriber=self.user),
+            'author_id',
+            'author_id',
+        )
+
+    def prime_recipes(self, recipes):
+        """Ставит в очередь флаги для страницы рецептов и их авторов."""
+        if self.user is None:
+            return
+        recipe_ids = [recipe.id for recipe in recipes]
+        self.favorites.prime(recipe_ids)
+        self.shopping_carts.prime(recipe_ids)
+        self.subscriptions.prime(recipe.author_id for recipe in recipes)
+
+    def prime_users(self, users):
+        """Ставит в очередь флаги подписки для страницы пользователей."""
+        if self.user is None:
+            return
+        self.subscriptions.prime(user.id for user in users)
+
+    def is_favorited(self, recipe):
+        """Проверяет, в избранном ли рецепт."""
+        return self.user is not None and self.favorites.load(recipe.id)
+
+    def is_in_shopping_cart(self, recipe):
+        """Проверяет, в корзине ли рецепт."""
+        return self.user is not None and self.shopping_carts.load(recipe.id)
+
+    def is_subscribed(self, author):
+        """Проверяет подписку на автора."""
+        return self.user is not None and self.subscriptions.load(author.id)
+
+    def recipe_flags(self, recipe):
+        """Возвращает флаги пользователя для рецепта и его автора."""
+        if self.user is None:
+            return {
+                'is_subscribed': False,
+                'is_favorited': False,
+                'is_in_shopping_cart': False,
+            }
+        return {
+            'is_subscribed': self.subscriptions.load(recipe.author_id),
+            'is_favorited': self.favorites.load(recipe.id),
+            'is_in_shopping_cart': self.shopping_carts.load(recipe.id),
+        }
+
+
+def get_loader(request):
+    """Возвращает загрузчик, привязанный к текущему запросу."""
+    loader = getattr(request, LOADER_ATTRIBUTE, None)
+    if loader is None:
+        loader = RequestLoader(getattr(request, 'user', None))
+        if request is not None:
+            setattr(request, LOADER_ATTRIBUTE, loader)
+    return loader
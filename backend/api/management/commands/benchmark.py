@@ -0,0 +1,400 @@
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.seed_data import USERNAME_PREFIX
+from foodgram_backend.constants import PAGE_SIZE
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+DEFAULT_MIX = os.path.join(settings.BASE_DIR, 'data/benchmark_requests.jsonl')
+PLACEHOLDER = re.compile(r'{(\w+)}')
+POSTMAN_VARIABLE = re.compile(r'{{(\w+)}}')
+POSTMAN_VARIABLES = {
+    'userId': '{user_id}',
+    'recipeId': '{recipe_id}',
+    'ingredientNameFirstLatter': '{ingredient_prefix}',
+}
+SAMPLE_SIZE = 1000
+TOKENS = 10
+SERVER_COMMANDS = {
+    'gunicorn': (
+        '{python} -m gunicorn foodgram_backend.wsgi:application '
+        '--bind {bind} --workers {workers} --threads {threads}'
+    ),
+    'uvicorn': (
+        '{python} -m gunicorn foodgram_backend.asgi:application '
+        '--worker-class uvicorn.workers.UvicornWorker '
+        '--bind {bind} --workers {workers}'
+    ),
+}
+
+
+def percentile(values, rank):
+    """Возвращает перцентиль методом ближайшего ранга."""
+    if not values:
+        return None
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def load_mix(path):
+    """Читает набор запросов из файла JSON Lines."""
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def load_postman(path):
+    """Извлекает GET-запросы из Postman-коллекции."""
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    templates = {}
+
+    def walk(items):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'])
+                continue
+            request = item['request']
+            url = request['url']
+            raw = url['raw'] if isinstance(url, dict) else url
+            if request['method'] != 'GET':
+                continue
+            path = raw.replace('{{baseUrl}}', '')
+            path = POSTMAN_VARIABLE.sub(
+                lambda match: POSTMAN_VARIABLES.get(
+                    match.group(1), match.group(0)
+                ),
+                path,
+            )
+            if '{{' in path:
+                continue
+            auth = request.get('auth', {}).get('type') == 'apikey'
+            templates[(path, auth)] = {
+                'name': f'postman:{path}',
+                'method': 'GET',
+                'path': path,
+                'auth': auth,
+                'weight': 1,
+            }
+
+    walk(collection['item'])
+    return list(templates.values())
+
+
+def git_commit():
+    """Возвращает хеш текущего коммита, если доступен git."""
+    try:
+        return subprocess.check_output(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Replay a request mix against the app and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='JSON Lines file with the request mix')
+        parser.add_argument('--postman',
+                            help='Add GET requests from a Postman collection')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--url',
+                            help='Benchmark a running server instead of the '
+                                 'in-process WSGI handler')
+        parser.add_argument('--server', choices=tuple(SERVER_COMMANDS),
+                            help='Start a WSGI (gunicorn) or ASGI (uvicorn) '
+                                 'server for the run')
+        parser.add_argument('--server-command',
+                            help='Custom command to start the server, '
+                                 '{bind} is replaced with host:port')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Threads per gunicorn worker or size of '
+                                 'the DB thread pool of an ASGI worker')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--output', help='Write results to a JSON file')
+        parser.add_argument('--compare',
+                            help='Compare with a previous results file')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        templates = load_mix(options['mix'])
+        if options['postman']:
+            templates += load_postman(options['postman'])
+        context = self.get_context()
+        plan = [
+            self.fill(template, context, rng)
+            for template in rng.choices(
+                templates,
+                weights=[template.get('weight', 1) for template in templates],
+                k=options['warmup'] + options['requests'],
+            )
+        ]
+        tokens = self.get_tokens()
+        server = None
+        url = options['url']
+        if options['server'] or options['server_command']:
+            server, url = self.start_server(options)
+        try:
+            if url:
+                mode = 'http ({})'.format(
+                    options['server']
+                    or ('custom' if options['server_command'] else 'external')
+                )
+                samples, elapsed = self.run_http(
+                    plan, url, tokens, options, rng
+                )
+            else:
+                mode = 'wsgi in-process'
+                samples, elapsed = self.run_in_process(plan, tokens, rng)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        samples = samples[options['warmup']:]
+        results = self.summarize(samples, elapsed, mode, options)
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                self.compare(json.load(file), results)
+
+    def get_context(self):
+        """Собирает значения для подстановки в пути запросов."""
+        users = User.objects.filter(username__startswith=f'{USERNAME_PREFIX}-')
+        context = {
+            'user_id': list(users.values_list('id', flat=True)[:SAMPLE_SIZE]),
+            'recipe_id': list(
+                Recipe.objects.values_list('id', flat=True)[:SAMPLE_SIZE]
+            ),
+            'short_link': list(
+                Recipe.objects.exclude(short_link=None)
+                .values_list('short_link', flat=True)[:SAMPLE_SIZE]
+            ),
+            'ingredient_prefix': sorted({
+                name[:2] for name in Ingredient.objects.values_list(
+                    'name', flat=True
+                )
+            }),
+        }
+        if not context['user_id'] or not context['recipe_id']:
+            raise CommandError('No benchmark data, run seed_data first.')
+        pages = max(1, Recipe.objects.count() // PAGE_SIZE)
+        context['page'] = [1, pages // 2 or 1, pages]
+        return context
+
+    def get_tokens(self):
+        """Возвращает токены нескольких тестовых пользователей."""
+        users = User.objects.filter(
+            username__startswith=f'{USERNAME_PREFIX}-'
+        )[:TOKENS]
+        return [
+            Token.objects.get_or_create(user=user)[0].key for user in users
+        ]
+
+    def fill(self, template, context, rng):
+        """Подставляет случайные значения в шаблон запроса."""
+        path = PLACEHOLDER.sub(
+            lambda match: str(rng.choice(context[match.group(1)])),
+            template['path'],
+        )
+        return template['name'], template.get('method', 'GET'), path, (
+            template.get('auth', False)
+        )
+
+    def start_server(self, options):
+        """Запускает сервер приложения и ждет, пока он начнет отвечать."""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        bind = f'127.0.0.1:{port}'
+        command = options['server_command'] or SERVER_COMMANDS[
+            options['server']
+        ].format(
+            python=sys.executable,
+            bind='{bind}',
+            workers=options['workers'],
+            threads=options['threads'],
+        )
+        server = subprocess.Popen(
+            command.format(bind=bind).split(),
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, ASYNC_DB_THREADS=str(options['threads'])),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        url = f'http://{bind}'
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f'{url}/api/ingredients/?name=zz')
+                return server, url
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Server did not start: {command}')
+
+    def run_in_process(self, plan, tokens, rng):
+        """Выполняет запросы через WSGI-обработчик Django в этом процессе."""
+        host = next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+             if host != '*'),
+            'localhost',
+        )
+        client = Client(HTTP_HOST=host)
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        samples = []
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            for name, method, path, auth in plan:
+                headers = {}
+                if auth:
+                    headers['HTTP_AUTHORIZATION'] = (
+                        f'Token {rng.choice(tokens)}'
+                    )
+                queries[0] = 0
+                request_started = time.perf_counter()
+                response = getattr(client, method.lower())(path, **headers)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                samples.append((
+                    name,
+                    time.perf_counter() - request_started,
+                    response.status_code,
+                    queries[0],
+                ))
+        return samples, time.perf_counter() - started
+
+    def run_http(self, plan, url, tokens, options, rng):
+        """Выполняет запросы к запущенному серверу в несколько потоков."""
+        def send(request):
+            name, method, path, token = request
+            http_request = urllib.request.Request(
+                url + urllib.parse.quote(path, safe='/?=&'), method=method
+            )
+            if token:
+                http_request.add_header('Authorization', f'Token {token}')
+            request_started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(http_request) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            return name, time.perf_counter() - request_started, status, None
+
+        requests = [
+            (name, method, path, rng.choice(tokens) if auth else None)
+            for name, method, path, auth in plan
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            samples = list(executor.map(send, requests))
+        return samples, time.perf_counter() - started
+
+    def summarize(self, samples, elapsed, mode, options):
+        """Считает перцентили, RPS и число запросов к БД по эндпоинтам."""
+        grouped = defaultdict(list)
+        for sample in samples:
+            grouped[sample[0]].append(sample)
+        endpoints = {}
+        for name, items in sorted(grouped.items()):
+            latencies = sorted(item[1] for item in items)
+            queries = [item[3] for item in items if item[3] is not None]
+            endpoints[name] = {
+                'requests': len(items),
+                'errors': sum(1 for item in items if item[2] >= 500),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'mean_queries': (
+                    sum(queries) / len(queries) if queries else None
+                ),
+            }
+        latencies = sorted(sample[1] for sample in samples)
+        return {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'mode': mode,
+            'requests': len(samples),
+            'concurrency': 1 if mode.startswith('wsgi') else (
+                options['concurrency']
+            ),
+            'workers': options['workers'] if options['server'] else None,
+            'threads': options['threads'] if options['server'] else None,
+            'rps': len(samples) / elapsed if elapsed else None,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        """Печатает таблицу результатов."""
+        self.stdout.write(
+            f'{results["mode"]}, commit {results["commit"]}: '
+            f'{results["requests"]} requests, {results["rps"]:.1f} rps, '
+            f'p50 {results["p50_ms"]:.1f} ms, p95 {results["p95_ms"]:.1f} ms, '
+            f'p99 {results["p99_ms"]:.1f} ms'
+        )
+        self.stdout.write(
+            f'{"endpoint":40} {"n":>6} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"queries":>8} {"5xx":>5}'
+        )
+        for name, stats in results['endpoints'].items():
+            queries = stats['mean_queries']
+            self.stdout.write(
+                f'{name[:40]:40} {stats["requests"]:>6} '
+                f'{stats["p50_ms"]:>8.2f} {stats["p95_ms"]:>8.2f} '
+                f'{stats["p99_ms"]:>8.2f} '
+                f'{"-" if queries is None else f"{queries:.1f}":>8} '
+                f'{stats["errors"]:>5}'
+            )
+
+    def compare(self, previous, results):
+        """Печатает изменение p95 и RPS относительно прошлого запуска."""
+        self.stdout.write(
+            f'Compared with {previous.get("commit")}: rps '
+            f'{previous["rps"]:.1f} -> {results["rps"]:.1f}'
+        )
+        for name, stats in results['endpoints'].items():
+            old = previous['endpoints'].get(name)
+            if old is None:
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            self.stdout.write(
+                f'{name[:40]:40} p95 {old["p95_ms"]:8.2f} -> '
+                f'{stats["p95_ms"]:8.2f} ms ({change:+.0f}%)'
+            )
@@ -0,0 +1,174 @@
+import random
+from io import BytesIO, StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from api.cache import RECIPES_VERSION, bump_versions
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from recipes.short_links import encode_base62
+from users.models import Subscription, User
+
+IMAGE_NAME = 'recipes/images/benchmark.png'
+USERNAME_PREFIX = 'bench'
+PASSWORD = 'benchmark-password'
+
+
+def sample_pairs(left, right, per_item, rng, exclude_self=False):
+    """Возвращает уникальные пары (элемент слева, случайный справа)."""
+    for item in left:
+        candidates = [
+            other for other in rng.sample(right, min(per_item + 1, len(right)))
+            if not (exclude_self and other == item)
+        ]
+        for other in candidates[:per_item]:
+            yield item, other
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Favorites per user')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Shopping cart recipes per user')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Subscriptions per user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete previously seeded benchmark users and their data'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError(
+                'Not enough ingredients, run load_ingredients first.'
+            )
+        if options['clear']:
+            User.objects.filter(
+                username__startswith=f'{USERNAME_PREFIX}-'
+            ).delete()
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (600, 400), 'orange').save(buffer, 'PNG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        start = User.objects.filter(
+            username__startswith=f'{USERNAME_PREFIX}-'
+        ).count()
+        password = make_password(PASSWORD)
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                (
+                    User(
+                        username=f'{USERNAME_PREFIX}-{number}',
+                        email=f'{USERNAME_PREFIX}-{number}@example.com',
+                        first_name='Бенчмарк',
+                        last_name='Пользователь',
+                        password=password,
+                    )
+                    for number in range(start, start + options['users'])
+                ),
+                batch_size=batch_size,
+            )
+            user_ids = list(
+                User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list('id', flat=True)
+            )
+            Recipe.objects.bulk_create(
+                (
+                    Recipe(
+                        author_id=rng.choice(user_ids),
+                        image=IMAGE_NAME,
+                        name=f'Рецепт {number}',
+                        text='Синтетический рецепт для нагрузочного теста.',
+                        cooking_time=rng.randint(5, 120),
+                    )
+                    for number in range(options['recipes'])
+                ),
+                batch_size=batch_size,
+            )
+            recipe_ids = list(
+                Recipe.objects.filter(author_id__in=user_ids)
+                .values_list('id', flat=True)
+            )
+            Recipe.objects.bulk_update(
+                (
+                    Recipe(id=recipe_id, short_link=encode_base62(recipe_id))
+                    for recipe_id in recipe_ids
+                ),
+                ('short_link',),
+                batch_size=batch_size,
+            )
+            RecipeIngredient.objects.bulk_create(
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for recipe_id, ingredient_id in sample_pairs(
+                        recipe_ids,
+                        ingredient_ids,
+                        options['ingredients_per_recipe'],
+                        rng,
+                    )
+                ),
+                batch_size=batch_size,
+            )
+            for model, per_user in (
+                (Favorite, options['favorites']),
+                (ShoppingCart, options['carts']),
+            ):
+                model.objects.bulk_create(
+                    (
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for user_id, recipe_id in sample_pairs(
+                            user_ids, recipe_ids, per_user, rng
+                        )
+                    ),
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+            Subscription.objects.bulk_create(
+                (
+                    Subscription(subscriber_id=subscriber, author_id=author)
+                    for subscriber, author in sample_pairs(
+                        user_ids,
+                        user_ids,
+                        options['subscriptions'],
+                        rng,
+                        exclude_self=True,
+                    )
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+        call_command('reconcile_counters', stdout=StringIO())
+        call_command('update_recipe_scores', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        call_command('rebuild_feeds', stdout=StringIO())
+        bump_versions(RECIPES_VERSION)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users and {len(recipe_ids)} recipes.'
+        ))
@@ -0,0 +1,151 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+METRICS = (
+    ('queries', 'foodgram_db_queries', 'Число SQL-запросов', QUERY_BUCKETS),
+    (
+        'db_time',
+        'foodgram_db_duration_seconds',
+        'Время выполнения SQL-запросов',
+        LATENCY_BUCKETS,
+    ),
+    (
+        'serializer_time',
+        'foodgram_serializer_duration_seconds',
+        'Время сериализации ответа',
+        LATENCY_BUCKETS,
+    ),
+    (
+        'total_time',
+        'foodgram_request_duration_seconds',
+        'Полное время обработки запроса',
+        LATENCY_BUCKETS,
+    ),
+)
+
+current_request = ContextVar('current_request', default=None)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """Добавляет наблюдение."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Возвращает пары (граница, накопленное число) для экспорта."""
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.total_time = 0
+        self.serializing = False
+
+    def finish(self):
+        """Фиксирует полное время обработки запроса."""
+        self.total_time = time.perf_counter() - self.started
+
+
+class MetricsRegistry:
+    """Хранилище гистограмм по эндпоинтам в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, endpoint, metrics):
+        """Добавляет метрики запроса в гистограммы эндпоинта."""
+        with self.lock:
+            for attribute, _, _, buckets in METRICS:
+                key = (attribute, endpoint)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(getattr(metrics, attribute))
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        lines = []
+        with self.lock:
+            for attribute, name, description, _ in METRICS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, endpoint), histogram in sorted(
+                    self.histograms.items()
+                ):
+                    if metric != attribute:
+                        continue
+                    label = f'endpoint="{endpoint}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}'
+                        )
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def count_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL, считающая запросы и их время."""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+@contextmanager
+def serializer_timer():
+    """Учитывает время сериализации верхнего уровня в метриках запроса."""
+    metrics = current_request.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics.serializing = False
+
+
+class TimedSerializerMixin:
+    """Миксин сериализатора, замеряющий время to_representation."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
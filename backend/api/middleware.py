@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+from api.metrics import RequestMetrics, current_request, registry
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Превышен бюджет SQL-запросов эндпоинта."""
+
+
+def get_endpoint_name(request, view_func):
+    """Возвращает имя эндпоинта вида RecipeViewSet.list."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class MetricsMiddleware:
+    """Собирает число запросов к БД, время БД, сериализации и ответа.
+
+    Метрики группируются по вьюсету и действию. Если для эндпоинта
+    задан бюджет в QUERY_BUDGETS, его превышение пишется в лог,
+    а при QUERY_BUDGET_STRICT (в тестах) приводит к исключению.
+    Работает и в синхронном, и в асинхронном стеке middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, metrics)
+        return response
+
+    def finish(self, request, metrics):
+        """Записывает метрики запроса и проверяет бюджет."""
+        metrics.finish()
+        endpoint = getattr(request, 'metrics_endpoint', None)
+        if endpoint is not None:
+            registry.record(endpoint, metrics)
+            self.check_budget(endpoint, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_endpoint = get_endpoint_name(request, view_func)
+
+    def check_budget(self, endpoint, metrics):
+        """Проверяет бюджет SQL-запросов эндпоинта."""
+        budget = settings.QUERY_BUDGETS.get(endpoint)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = (
+            f'{endpoint}: {metrics.queries} SQL queries, budget is {budget}'
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -1,10 +1,202 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+import math
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from foodgram_backend.constants import PAGE_SIZE
 
 
+def is_scalar(value):
+    """Проверяет, что значение курсора — строка или конечное число."""
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (курсору) без OFFSET и COUNT.
+
+    Порядок задается атрибутом keyset_ordering вьюсета, последним полем
+    должен идти уникальный ключ, например ('-created_at', '-id').
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    default_ordering = ('-id',)
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = getattr(
+            view, 'keyset_ordering', self.default_ordering
+        )
+        self.count = None
+        if request.query_params.get(self.count_query_param):
+            self.count = queryset.count()
+        position = self.decode_cursor(
+            request, self.get_ordering_fields(queryset)
+        )
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        page = list(
+            queryset.order_by(*self.ordering)[:self.page_size + 1]
+        )
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        """Возвращает размер страницы из параметра limit."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_position_filter(self, position):
+        """Строит условие «после позиции» для лексикографического ключа."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(self.ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def get_ordering_fields(self, queryset):
+        """Возвращает поля модели или аннотаций из ключа сортировки."""
+        fields = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            fields.append(
+                annotation.output_field if annotation is not None
+                else queryset.model._meta.get_field(name)
+            )
+        return fields
+
+    def decode_cursor(self, request, fields):
+        """Декодирует курсор и приводит значения к типам полей ключа.
+
+        Курсор приходит от клиента, поэтому значение, которое нельзя
+        привести к типу поля, считается неверным курсором.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+            )
+        except (ValueError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(fields)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        for field, value in zip(fields, position):
+            if not is_scalar(value):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, item):
+        """Кодирует позицию объекта в курсор."""
+        position = []
+        for field in self.ordering:
+            value = getattr(item, field.lstrip('-'))
+            if isinstance(value, date):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode('ascii')
+        ).decode('ascii')
+
+    def get_next_link(self):
+        """Возвращает ссылку на следующую страницу."""
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+class FeedPagination(KeysetPagination):
+    """Пагинация по ключу для ленты, собранной не из одного queryset.
+
+    Вместо queryset принимает функцию fetch(position, limit), которая
+    возвращает до limit объектов после позиции в порядке ordering;
+    queryset нужен только для проверки типов значений курсора.
+    """
+
+    ordering = ('-created_at', '-id')
+
+    def paginate_feed(self, fetch, request, queryset):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        page = fetch(
+            self.decode_cursor(request, self.get_ordering_fields(queryset)),
+            self.page_size + 1,
+        )
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+
 class CustomPagination(PageNumberPagination):
-    """Кастомная пагинация."""
+    """Кастомная пагинация.
+
+    По умолчанию постраничная, при наличии параметра cursor
+    переключается на пагинацию по ключу. Списки, ранжированные
+    в памяти, всегда разбиваются на страницы.
+    """
 
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if isinstance(queryset, QuerySet) and (
+            self.keyset_pagination_class.cursor_query_param
+            in request.query_params
+        ):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,128 @@
+import json
+import uuid
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class RawJSON:
+    """Заранее закодированный фрагмент JSON в данных ответа."""
+
+    __slots__ = ('content',)
+
+    def __init__(self, content):
+        self.content = content
+
+
+class RawJSONEncoder(encoders.JSONEncoder):
+    """Кодировщик, заменяющий фрагменты RawJSON строками-метками."""
+
+    def __init__(self, *args, marker=None, fragments=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.marker = marker
+        self.fragments = fragments
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            self.fragments.append(obj.content)
+            return self.marker
+        return super().default(obj)
+
+
+def use_orjson():
+    """Можно ли кодировать через orjson с тем же результатом."""
+    return (
+        orjson is not None
+        and api_settings.COMPACT_JSON
+        and api_settings.UNICODE_JSON
+    )
+
+
+def encode_json(data, marker=None, fragments=None):
+    """Кодирует данные в JSON так же, как JSONRenderer без отступов.
+
+    При установленном orjson кодирует через него. Даты, Decimal
+    и ленивые строки передаются кодировщику DRF, чтобы их вывод
+    не отличался.
+    """
+    encoder = RawJSONEncoder(marker=marker, fragments=fragments)
+    if use_orjson():
+        try:
+            content = orjson.dumps(
+                data,
+                default=encoder.default,
+                option=(
+                    orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_NON_STR_KEYS
+                ),
+            )
+        except orjson.JSONEncodeError:
+            if fragments:
+                fragments.clear()
+        else:
+            for separator, escaped in LINE_SEPARATORS:
+                content = content.replace(separator, escaped)
+            return content
+    separators = (
+        (',', ':') if api_settings.COMPACT_JSON else (', ', ': ')
+    )
+    ret = json.dumps(
+        data,
+        cls=RawJSONEncoder,
+        marker=marker,
+        fragments=fragments,
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=separators,
+    )
+    ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return ret.encode()
+
+
+class RawJSONRenderer(JSONRenderer):
+    """Быстрый JSONRenderer, вставляющий фрагменты RawJSON без изменений.
+
+    Ответ кодируется через orjson, если он установлен. Фрагменты
+    кодируются меткой, уникальной для каждого ответа, после чего
+    метки заменяются содержимым фрагментов.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(
+            accepted_media_type or '', renderer_context or {}
+        )
+        marker = uuid.uuid4().hex
+        fragments = []
+        if indent is None:
+            content = encode_json(data, marker, fragments)
+        else:
+            content = json.dumps(
+                data,
+                cls=RawJSONEncoder,
+                marker=marker,
+                fragments=fragments,
+                indent=indent,
+                ensure_ascii=self.ensure_ascii,
+                allow_nan=not self.strict,
+            ).encode()
+        if not fragments:
+            return content
+        parts = content.split(f'"{marker}"'.encode())
+        chunks = [parts[0]]
+        for fragment, part in zip(fragments, parts[1:]):
+            chunks.append(fragment)
+            chunks.append(part)
+        return b''.join(chunks)
@@ -1,10 +1,30 @@
-import base64
 import uuid
 
-from django.core.files.base import ContentFile
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    OuterRef,
+    Prefetch,
+    Subquery,
+    prefetch_related_objects,
+)
 from rest_framework import serializers
 
-from foodgram_backend.constants import IMAGE
+from api.fast_serializers import dump
+from api.images import (
+    ImageDecodeError,
+    decode_base64_image,
+    variant_urls,
+)
+from api.ingredient_catalog import ingredient_catalog
+from api.loaders import get_loader
+from api.metrics import TimedSerializerMixin
+from api.tasks import (
+    delete_image,
+    generate_avatar_variants,
+    generate_recipe_image_variants,
+)
+from foodgram_backend.constants import BATCH_IDS_MAX, IMAGE
+from recipes.feed import fan_out
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -12,6 +32,7 @@ from recipes.models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from recipes.signals import recipe_ingredients_changed
 from users.models import Subscription, User
 
 
@@ -28,10 +49,48 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             filename = f'{self.file_prefix}_{uuid.uuid4()}.{ext}'
-            data = ContentFile(base64.b64decode(imgstr), name=filename)
+            try:
+                data = decode_base64_image(imgstr, filename)
+            except ImageDecodeError as error:
+                raise serializers.ValidationError(str(error))
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения.
+
+    Готовность копий берется из поля модели <image_field>_variants_ready,
+    которое выставляет фоновая задача.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        self.ready_field = f'{image_field}_variants_ready'
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return self.represent(instance, self.context.get('request'))
+
+    def represent(self, instance, request):
+        """Ссылки для объекта, используется и в api.fast_serializers."""
+        return variant_urls(
+            getattr(instance, self.image_field),
+            getattr(instance, self.ready_field),
+            request,
+        )
+
+
+class PrimingListSerializer(serializers.ListSerializer):
+    """Список, заранее загружающий флаги пользователя для всей страницы."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.prime(items)
+        return super().to_representation(items)
+
+
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для модели пользователя с полем аватара."""
 
@@ -41,6 +100,21 @@ class AvatarSerializer(serializers.ModelSerializer):
         model = User
         fields = ('avatar',)
 
+    def update(self, instance, validated_data):
+        """Обновляет аватар.
+
+        Уменьшенные копии нового аватара создаются, а старый файл
+        удаляется фоновыми задачами.
+        """
+        old_avatar = instance.avatar.name
+        validated_data['avatar_variants_ready'] = False
+        user = super().update(instance, validated_data)
+        if user.avatar:
+            generate_avatar_variants.delay(user.id, user.avatar.name)
+        if old_avatar and old_avatar != user.avatar.name:
+            delete_image.delay(old_avatar)
+        return user
+
 
 class UserPostSerializer(serializers.ModelSerializer):
     """Сериализатор создания нового пользователя."""
@@ -63,10 +137,13 @@ class UserPostSerializer(serializers.ModelSerializer):
         return User.objects.create_user(**validated_data)
 
 
-class UserGetSerializer(serializers.ModelSerializer):
+class UserGetSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор информации о пользователе."""
 
     avatar = Base64ImageField(allow_null=True, required=False)
+    avatar_variants = ImageVariantsField('avatar')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -78,19 +155,23 @@ class UserGetSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_variants',
             'is_subscribed',
         )
+        list_serializer_class = PrimingListSerializer
+
+    def prime(self, users):
+        """Ставит в очередь проверку подписок на пользователей страницы."""
+        get_loader(self.context.get('request')).prime_users(users)
 
     def get_is_subscribed(self, author):
         """Проверка подписки пользователей."""
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and user.subscribers.filter(author=author).exists()
-        )
+        return get_loader(self.context.get('request')).is_subscribed(author)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор инргедиентов."""
 
     class Meta:
@@ -98,17 +179,50 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+def unknown_ingredients_message(ingredient_ids):
+    """Сообщение об ингредиентах, которых нет в справочнике."""
+    return 'Ингредиенты не найдены: {}.'.format(
+        ', '.join(map(str, sorted(ingredient_ids)))
+    )
+
+
+def missing_ingredients(ingredient_ids):
+    """Возвращает id ингредиентов, которых нет в базе данных."""
+    return set(ingredient_ids) - set(
+        Ingredient.objects.filter(id__in=ingredient_ids)
+        .values_list('id', flat=True)
+    )
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Список ингредиентов рецепта с проверкой id по справочнику."""
+
+    def to_internal_value(self, data):
+        """Проверяет id ингредиентов, сообщая обо всех неизвестных сразу.
+
+        Ингредиенты ищутся в справочнике в памяти процесса, поэтому
+        проверка не обращается к базе данных.
+        """
+        items = super().to_internal_value(data)
+        unknown = ingredient_catalog.unknown(
+            {item['ingredient_id'] for item in items}
+        )
+        if unknown:
+            raise serializers.ValidationError(
+                unknown_ingredients_message(unknown)
+            )
+        return items
+
+
 class RecipeIngredientPostSerializer(serializers.ModelSerializer):
     """Сериализатор создания связи рецепта c ингредиентами."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
-    )
+    id = serializers.IntegerField(source='ingredient_id')
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
     def validate_amount(self, value):
         if not value:
@@ -119,11 +233,9 @@ class RecipeIngredientPostSerializer(serializers.ModelSerializer):
 class RecipeIngredientGetSerializer(serializers.ModelSerializer):
     """Сериализатор получения связи рецепта c ингредиентами."""
 
-    id = serializers.IntegerField(source='ingredient.id')
-    name = serializers.CharField(source='ingredient.name')
-    measurement_unit = serializers.CharField(
-        source='ingredient.measurement_unit'
-    )
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = RecipeIngredient
@@ -134,6 +246,18 @@ class RecipeIngredientGetSerializer(serializers.ModelSerializer):
             'amount'
         )
 
+    def get_ingredient(self, item):
+        """Возвращает название и единицу измерения из справочника."""
+        return ingredient_catalog.get(item.ingredient_id) or (
+            item.ingredient.name, item.ingredient.measurement_unit
+        )
+
+    def get_name(self, item):
+        return self.get_ingredient(item)[0]
+
+    def get_measurement_unit(self, item):
+        return self.get_ingredient(item)[1]
+
 
 class RecipePostSerializer(serializers.ModelSerializer):
     """Сериализатор создания рецепта."""
@@ -166,7 +290,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
                 'Отсутствует обязательное поле ингредиенты'
             )
         ingredients_id = [
-            ingredient.get('ingredient').id for ingredient in ingredients
+            ingredient['ingredient_id'] for ingredient in ingredients
         ]
         if len(set(ingredients_id)) != len(ingredients):
             raise serializers.ValidationError(
@@ -174,29 +298,85 @@ class RecipePostSerializer(serializers.ModelSerializer):
             )
         return value
 
-    def add_ingredients(self, model, recipe, ingredients):
-        """Добавляет ингредиенты к рецепту."""
-        model.objects.bulk_create(
-            (
-                model(
-                    recipe=recipe,
-                    ingredient=ingredient['ingredient'],
-                    amount=ingredient['amount']
+    def _update_ingredients(self, recipe, ingredients, current=None):
+        """Приводит ингредиенты рецепта к переданному списку.
+
+        Переданные пары (ингредиент, количество) сравниваются с текущими
+        строками, изменения вносятся не более чем тремя пакетными
+        запросами: удаление, изменение количества и добавление.
+        """
+        if current is None:
+            current = {
+                item.ingredient_id: item
+                for item in recipe.recipe_ingredients.all()
+            }
+        amounts = {
+            ingredient['ingredient_id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = [
+            item.id for ingredient_id, item in current.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, item in current.items():
+            if ingredient_id in amounts and (
+                item.amount != amounts[ingredient_id]
+            ):
+                item.amount = amounts[ingredient_id]
+                changed.append(item)
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            # Справочник сверяется с базой раз в CHECK_INTERVAL секунд,
+            # добавляемый ингредиент могли удалить после проверки.
+            missing = missing_ingredients(
+                [item.ingredient_id for item in added]
+            )
+            if missing:
+                raise serializers.ValidationError(
+                    {'ingredients': [unknown_ingredients_message(missing)]}
+                )
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or added:
+            transaction.on_commit(
+                lambda: recipe_ingredients_changed.send(
+                    sender=Recipe,
+                    recipe_id=recipe.id,
+                    ingredient_ids=list(amounts),
                 )
-                for ingredient in ingredients
             )
-        )
 
-    def _update_ingredients(self, recipe, ingredients):
-        """Обновляет теги и ингредиенты для рецепта."""
-        recipe.recipe_ingredients.all().delete()
-        RecipeIngredient.objects.bulk_create(
-            [
-                RecipeIngredient(recipe=recipe, **ingredient)
-                for ingredient in ingredients
-            ]
-        )
+    def save(self, **kwargs):
+        """Сохраняет рецепт, сообщая об ингредиентах, удаленных при записи.
+
+        Внешние ключи проверяются при фиксации транзакции, поэтому
+        ингредиент, удаленный после проверки в _update_ingredients,
+        приводит к IntegrityError уже после create или update.
+        """
+        try:
+            return super().save(**kwargs)
+        except IntegrityError:
+            missing = missing_ingredients({
+                item['ingredient_id']
+                for item in self.validated_data['recipe_ingredients']
+            })
+            if not missing:
+                raise
+            raise serializers.ValidationError(
+                {'ingredients': [unknown_ingredients_message(missing)]}
+            )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создает новый рецепт с привязкой тегов и ингредиентов."""
         ingredients = validated_data.pop('recipe_ingredients')
@@ -204,23 +384,44 @@ class RecipePostSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(
             author=self.context['request'].user, **validated_data
         )
-        self._update_ingredients(recipe, ingredients)
+        self._update_ingredients(recipe, ingredients, current={})
+        fan_out.delay(recipe.id)
+        generate_recipe_image_variants.delay(recipe.id, recipe.image.name)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет рецепт с возможностью изменить теги и ингредиенты."""
+        """Обновляет рецепт с возможностью изменить теги и ингредиенты.
+
+        Ингредиенты обязательны и при частичном обновлении (см. validate),
+        строки состава приводятся к переданному списку.
+        """
         ingredients = validated_data.pop('recipe_ingredients')
-        self._update_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        old_image = instance.image.name
+        if 'image' in validated_data:
+            validated_data['image_variants_ready'] = False
+        recipe = super().update(instance, validated_data)
+        self._update_ingredients(recipe, ingredients)
+        if recipe.image.name != old_image:
+            generate_recipe_image_variants.delay(recipe.id, recipe.image.name)
+            delete_image.delay(old_image)
+        return recipe
 
     def to_representation(self, instance):
-        """Возвращает данные рецепта через RecipeGetSerializer."""
+        """Возвращает данные рецепта через RecipeGetSerializer.
+
+        Строки состава загружаются одним запросом, названия
+        ингредиентов берутся из справочника в памяти.
+        """
+        prefetch_related_objects([instance], 'recipe_ingredients')
         return RecipeGetSerializer(
             instance, context={'request': self.context.get('request')}
         ).data
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор получения информации рецепта."""
 
     author = UserGetSerializer(read_only=True)
@@ -230,6 +431,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         read_only=True
     )
     image = Base64ImageField(required=True, allow_null=False)
+    image_variants = ImageVariantsField('image')
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited'
     )
@@ -247,31 +449,71 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
+        list_serializer_class = PrimingListSerializer
 
-    def check_user_status(self, obj, model_class):
-        """Проверяет статус пользователя."""
-        user = self.context.get('request')
-        return (
-            user and user.user.is_authenticated
-            and model_class.objects.filter(recipe=obj, user=user.user).exists()
-        )
+    def prime(self, recipes):
+        """Ставит в очередь проверку флагов для рецептов страницы."""
+        get_loader(self.context.get('request')).prime_recipes(recipes)
 
     def get_is_favorited(self, obj):
         """Проверяет, в избранном ли рецепт."""
-        return self.check_user_status(obj, Favorite)
+        return get_loader(self.context.get('request')).is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
         """Проверяет, в корзине ли рецепт."""
-        return self.check_user_status(obj, ShoppingCart)
+        return get_loader(
+            self.context.get('request')
+        ).is_in_shopping_cart(obj)
+
+
+class SnapshotAuthorSerializer(UserGetSerializer):
+    """Автор в снимке рецепта с меткой вместо флага подписки."""
+
+    def get_is_subscribed(self, author):
+        return self.context['slots']['is_subscribed']
+
+
+class RecipeSnapshotSerializer(RecipeGetSerializer):
+    """Публичная часть рецепта для снимка, см. api.snapshots.
+
+    Вместо флагов пользователя выводятся метки из context['slots'],
+    которые при сборке списка заменяются значениями флагов.
+    """
+
+    author = SnapshotAuthorSerializer(read_only=True)
 
+    class Meta(RecipeGetSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
 
-class MiniRecipeSerializer(serializers.ModelSerializer):
+    def get_is_favorited(self, obj):
+        return self.context['slots']['is_favorited']
+
+    def get_is_in_shopping_cart(self, obj):
+        return self.context['slots']['is_in_shopping_cart']
+
+
+class RecipeMatchSerializer(RecipeGetSerializer):
+    """Сериализатор рецепта, подобранного по набору ингредиентов."""
+
+    missing_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    class Meta(RecipeGetSerializer.Meta):
+        fields = RecipeGetSerializer.Meta.fields + ('missing_ingredients',)
+
+
+class MiniRecipeSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор получения краткой информации рецепта."""
 
     image = Base64ImageField(required=True, allow_null=False)
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Recipe
@@ -279,10 +521,42 @@ class MiniRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
 
+class IdsField(serializers.ListField):
+    """Непустой список id для пакетных операций, без повторов."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', BATCH_IDS_MAX)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return list(dict.fromkeys(super().to_internal_value(data)))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для пакетного добавления в избранное или покупки."""
+
+    recipes = IdsField()
+
+
+class AuthorIdsSerializer(serializers.Serializer):
+    """Список авторов для пакетной подписки."""
+
+    authors = IdsField()
+
+    def validate_authors(self, value):
+        """Проверка, что пользователь не подписывается на себя."""
+        if self.context['request'].user.id in value:
+            raise serializers.ValidationError('Нельзя подписаться на себя')
+        return value
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор добавления рецептов в избранное."""
 
@@ -349,17 +623,23 @@ class SubscriptionPostSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Возвращает данные о подписке в формате SubscriptionGetSerializer."""
         request = self.context.get('request')
+        author = SubscriptionGetSerializer.prepare_queryset(
+            User.objects.filter(id=instance.author_id), request
+        ).get()
         return SubscriptionGetSerializer(
-            instance.author, context={'request': request}
+            author, context={'request': request}
         ).data
 
 
-class SubscriptionGetSerializer(serializers.ModelSerializer):
+class SubscriptionGetSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор для получения подписок пользователей."""
 
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.IntegerField(default=0)
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.BooleanField(default=True)
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta:
         model = User
@@ -373,17 +653,51 @@ class SubscriptionGetSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count',
             'avatar',
+            'avatar_variants',
+        )
+
+    @staticmethod
+    def get_recipes_limit(request):
+        """Возвращает ограничение на число рецептов из параметров запроса."""
+        recipes_limit = request.GET.get('recipes_limit') if request else None
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
+    @classmethod
+    def prepare_queryset(cls, queryset, request):
+        """Добавляет к авторам первые рецепты.
+
+        Рецепты всех авторов страницы загружаются одним запросом,
+        ограничение recipes_limit применяется к каждому автору
+        коррелированным подзапросом.
+        """
+        recipes = Recipe.objects.only(
+            'id', 'author_id', 'name', 'image', 'image_variants_ready',
+            'cooking_time', 'created_at',
+        )
+        recipes_limit = cls.get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(
+                id__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .order_by('-created_at')
+                    .values('id')[:recipes_limit]
+                )
+            )
+        return queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
         )
 
     def get_recipes(self, author):
         """Получает список рецептов пользователя."""
-        recipes = author.recipes.all()
         request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
-        return MiniRecipeSerializer(
-            recipes,
-            many=True,
-            context={'request': request}
-        ).data
+        recipes = getattr(author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = author.recipes.all()
+            recipes_limit = self.get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return dump(
+            MiniRecipeSerializer, recipes, {'request': request}, many=True
+        )
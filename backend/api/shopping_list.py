@@ -0,0 +1,94 @@
+import csv
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from api.cache import (
+    INGREDIENTS_VERSION,
+    get_versions,
+    recipe_version,
+)
+from api.ingredient_catalog import ingredient_catalog
+from recipes.models import RecipeIngredient, ShoppingCart
+
+CACHE_KEY = 'shopping-list:{}'
+
+
+def cart_version(user_id):
+    """Имя счетчика версий списка покупок пользователя."""
+    return f'cart:{user_id}'
+
+
+def get_shopping_list(user):
+    """Возвращает агрегированный список покупок пользователя.
+
+    Результат кешируется и пересчитывается, только если изменились
+    рецепты в корзине пользователя или входящие в них рецепты.
+    Количества суммируются по id ингредиента, названия берутся
+    из справочника в памяти.
+    """
+    key = CACHE_KEY.format(user.id)
+    cart, ingredients = get_versions(
+        cart_version(user.id), INGREDIENTS_VERSION
+    )
+    entry = cache.get(key)
+    if entry is not None:
+        versions, recipe_ids, rows = entry
+        if versions == [cart, ingredients, *get_versions(
+            *(recipe_version(recipe_id) for recipe_id in recipe_ids)
+        )]:
+            return rows
+    recipe_ids = list(
+        ShoppingCart.objects.filter(user=user).values_list(
+            'recipe_id', flat=True
+        )
+    )
+    versions = [cart, ingredients, *get_versions(
+        *(recipe_version(recipe_id) for recipe_id in recipe_ids)
+    )]
+    amounts = dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('ingredient_id')
+        .annotate(sum=Sum('amount'))
+        .order_by()
+    )
+    rows = sorted(
+        (*ingredient, amounts[ingredient_id])
+        for ingredient_id, ingredient in ingredient_catalog.get_many(
+            list(amounts)
+        ).items()
+    )
+    cache.set(
+        key, (versions, recipe_ids, rows), settings.SHOPPING_LIST_CACHE_TIMEOUT
+    )
+    return rows
+
+
+def render_text(rows):
+    """Построчно отдает список покупок в виде текста."""
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield f'{separator}{name} - {amount} ({measurement_unit})'
+        separator = '\n'
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    """Построчно отдает список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, measurement_unit, amount in rows:
+        yield writer.writerow((name, amount, measurement_unit))
+
+
+RENDERERS = {
+    'txt': (render_text, 'text/plain'),
+    'csv': (render_csv, 'text/csv'),
+}
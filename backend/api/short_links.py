@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+from foodgram_backend.constants import SHORT_LINK_CACHE_SIZE
+from recipes.models import Recipe
+
+
+class ShortLinkCache:
+    """LRU-кеш соответствия коротких ссылок идентификаторам рецептов.
+
+    При промахе рецепт ищется в базе данных по индексу short_link.
+    """
+
+    def __init__(self, maxsize=SHORT_LINK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.links = OrderedDict()
+
+    def resolve(self, short_link):
+        """Возвращает id рецепта по короткой ссылке или None."""
+        with self.lock:
+            recipe_id = self.links.get(short_link)
+            if recipe_id is not None:
+                self.links.move_to_end(short_link)
+                return recipe_id
+        recipe_id = Recipe.objects.filter(
+            short_link=short_link
+        ).values_list('id', flat=True).first()
+        if recipe_id is not None:
+            with self.lock:
+                self.links[short_link] = recipe_id
+                if len(self.links) > self.maxsize:
+                    self.links.popitem(last=False)
+        return recipe_id
+
+    def discard(self, short_link):
+        """Удаляет короткую ссылку из кеша."""
+        with self.lock:
+            self.links.pop(short_link, None)
+
+
+short_link_cache = ShortLinkCache()
@@ -0,0 +1,296 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api.cache import (
+    bump_author,
+    bump_ingredients,
+    bump_recipe,
+    bump_versions,
+)
+from api.ingredient_catalog import ingredient_catalog
+from api.ingredient_matcher import recipe_matcher
+from api.metrics import count_query
+from api.shopping_list import cart_version
+from api.short_links import short_link_cache
+from api.snapshots import recipe_snapshots
+from api.tasks import delete_image
+from foodgram_backend.counters import change_counter, change_counters
+from recipes.feed import backfill, remove, remove_many
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeScore,
+    ShoppingCart,
+)
+from recipes.scores import (
+    add_event,
+    add_events,
+    remove_event,
+    remove_events,
+)
+from recipes.search import index_recipes, remove_recipes
+from recipes.signals import (
+    bulk_created,
+    bulk_deleted,
+    ingredients_loaded,
+    recipe_ingredients_changed,
+)
+from users.models import Subscription, User
+
+COUNTED = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscription: (User, 'author_id', 'subscribers_count'),
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+}
+
+# Поля пользователя, которые выводятся в ответах с рецептами и авторами.
+AUTHOR_FIELDS = frozenset((
+    'email', 'username', 'first_name', 'last_name',
+    'avatar', 'avatar_variants_ready',
+))
+
+
+@receiver(connection_created)
+def track_connection_queries(connection, **kwargs):
+    """Подключает подсчет SQL-запросов для метрик к соединению.
+
+    Обертка ставится на соединение любого потока, в том числе
+    потоков пула асинхронных вьюх.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(ingredients_loaded)
+def invalidate_ingredient_catalog(**kwargs):
+    """Сбрасывает справочник ингредиентов во всех процессах.
+
+    Индекс поиска по префиксу перестраивается вслед за справочником.
+    """
+    ingredient_catalog.invalidate()
+    bump_ingredients()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_cache(instance, **kwargs):
+    """Делает устаревшими кешированные ответы с рецептом."""
+    bump_recipe(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def save_recipe_snapshot(instance, **kwargs):
+    """Сохраняет снимок рецепта для списков после фиксации изменений."""
+    transaction.on_commit(lambda: recipe_snapshots.refresh([instance.id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image(instance, **kwargs):
+    """Удаляет файлы изображения удаленного рецепта."""
+    delete_image.delay(instance.image.name)
+
+
+@receiver(post_delete, sender=User)
+def delete_user_avatar(instance, **kwargs):
+    """Удаляет файлы аватара удаленного пользователя."""
+    if instance.avatar:
+        delete_image.delay(instance.avatar.name)
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_short_link(instance, **kwargs):
+    """Удаляет короткую ссылку удаленного рецепта из кеша."""
+    short_link_cache.discard(instance.short_link)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cache(instance, created, update_fields, **kwargs):
+    """Делает устаревшими кешированные ответы с данными автора.
+
+    Сохранение только служебных полей, например last_login при входе,
+    не меняет ответы и версию не увеличивает.
+    """
+    if created or update_fields is not None and not (
+        AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    bump_author(instance)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_list(instance, **kwargs):
+    """Делает устаревшим кешированный список покупок пользователя."""
+    bump_versions(cart_version(instance.user_id))
+
+
+@receiver((bulk_created, bulk_deleted), sender=ShoppingCart)
+def invalidate_shopping_lists(objs, **kwargs):
+    """Делает устаревшими списки покупок после пакетного изменения."""
+    bump_versions(*{cart_version(obj.user_id) for obj in objs})
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(instance, created, **kwargs):
+    """Создает строку рейтинга для нового рецепта."""
+    if created:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_score_event(sender, instance, created, **kwargs):
+    """Повышает рейтинг рецепта при добавлении в избранное или покупки."""
+    if created:
+        add_event(sender, instance.recipe_id, instance.created_at)
+
+
+@receiver(bulk_created, sender=Favorite)
+@receiver(bulk_created, sender=ShoppingCart)
+def add_score_events(sender, objs, **kwargs):
+    """Повышает рейтинг рецептов пакета одним запросом.
+
+    Время записей пакета различается на микросекунды, поэтому
+    события учитываются со временем первой записи.
+    """
+    add_events(sender, [obj.recipe_id for obj in objs], objs[0].created_at)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_score_event(sender, instance, **kwargs):
+    """Снижает рейтинг рецепта при удалении из избранного или покупок."""
+    remove_event(sender, instance.recipe_id, instance.created_at)
+
+
+@receiver(bulk_deleted, sender=Favorite)
+@receiver(bulk_deleted, sender=ShoppingCart)
+def remove_score_events(sender, objs, **kwargs):
+    """Снижает рейтинг рецептов после пакетного удаления."""
+    remove_events(sender, [(obj.recipe_id, obj.created_at) for obj in objs])
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    """Обновляет поисковый документ рецепта."""
+    index_recipes([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(instance, **kwargs):
+    """Удаляет рецепт из поискового индекса."""
+    remove_recipes([instance.id])
+
+
+@receiver(recipe_ingredients_changed)
+def update_ingredient_indexes(recipe_id, ingredient_ids=None, **kwargs):
+    """Обновляет поисковый документ и индекс подбора по ингредиентам."""
+    index_recipes([recipe_id])
+    if ingredient_ids is None:
+        ingredient_ids = RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', flat=True)
+    recipe_matcher.update(recipe_id, ingredient_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(instance, created, **kwargs):
+    """Обновляет документы рецептов с переименованным ингредиентом."""
+    if not created:
+        index_recipes(
+            RecipeIngredient.objects.filter(ingredient=instance)
+            .values_list('recipe_id', flat=True)
+            .distinct()
+        )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def collect_ingredient_recipes(instance, **kwargs):
+    """Запоминает рецепты удаляемого ингредиента.
+
+    Строки RecipeIngredient удаляются каскадно без сигналов, поэтому
+    поисковые документы обновляются после удаления ингредиента.
+    """
+    instance.recipe_ids = list(
+        RecipeIngredient.objects.filter(ingredient=instance)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Ingredient)
+def reindex_ingredient_recipes(instance, **kwargs):
+    """Обновляет индексы рецептов, в которых был удаленный ингредиент."""
+    index_recipes(getattr(instance, 'recipe_ids', ()))
+    recipe_matcher.invalidate()
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_matcher(instance, **kwargs):
+    """Удаляет рецепт из индекса подбора по ингредиентам."""
+    recipe_matcher.remove(instance.id)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(instance, created, **kwargs):
+    """Добавляет последние рецепты автора в ленту нового подписчика."""
+    if created:
+        backfill(instance.subscriber_id, instance.author_id)
+
+
+@receiver(bulk_created, sender=Subscription)
+def add_authors_to_feed(objs, **kwargs):
+    """Добавляет в ленты рецепты авторов после пакетной подписки."""
+    for obj in objs:
+        backfill(obj.subscriber_id, obj.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(instance, **kwargs):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    remove(instance.subscriber_id, instance.author_id)
+
+
+@receiver(bulk_deleted, sender=Subscription)
+def remove_authors_from_feed(objs, **kwargs):
+    """Убирает из лент рецепты авторов после пакетной отписки."""
+    remove_many([(obj.subscriber_id, obj.author_id) for obj in objs])
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    """Увеличивает счетчик связанного объекта при создании записи."""
+    if created:
+        model, attribute, field = COUNTED[sender]
+        change_counter(model, getattr(instance, attribute), field, 1)
+
+
+def decrement_counter(sender, instance, **kwargs):
+    """Уменьшает счетчик связанного объекта при удалении записи."""
+    model, attribute, field = COUNTED[sender]
+    change_counter(model, getattr(instance, attribute), field, -1)
+
+
+def increment_counters(sender, objs, **kwargs):
+    """Увеличивает счетчики связанных объектов после пакетной вставки."""
+    model, attribute, field = COUNTED[sender]
+    change_counters(
+        model, [getattr(obj, attribute) for obj in objs], field, 1
+    )
+
+
+def decrement_counters(sender, objs, **kwargs):
+    """Уменьшает счетчики связанных объектов после пакетного удаления."""
+    model, attribute, field = COUNTED[sender]
+    change_counters(
+        model, [getattr(obj, attribute) for obj in objs], field, -1
+    )
+
+
+for counted in COUNTED:
+    post_save.connect(increment_counter, sender=counted)
+    post_delete.connect(decrement_counter, sender=counted)
+    bulk_created.connect(increment_counters, sender=counted)
+    bulk_deleted.connect(decrement_counters, sender=counted)
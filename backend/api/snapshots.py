@@ -0,0 +1,186 @@
+import json
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+
+from api.cache import (
+    INGREDIENTS_VERSION,
+    author_version,
+    get_versions,
+    recipe_version,
+)
+from api.fast_serializers import dump
+from api.loaders import get_loader
+from api.metrics import serializer_timer
+from api.renderers import RawJSON, encode_json
+from api.serializers import RecipeSnapshotSerializer
+from recipes.models import Recipe
+
+SNAPSHOT_KEY = 'snapshot:{}:{}:{}:{}'
+FLAGS = ('is_subscribed', 'is_favorited', 'is_in_shopping_cart')
+ORIGIN = 'origin'
+VALUES = {True: b'true', False: b'false'}
+
+
+class SnapshotRequest:
+    """Заменяет запрос при построении снимка.
+
+    Абсолютные ссылки строятся от метки вместо адреса сайта, поэтому
+    снимок не зависит от хоста, по которому пришел запрос.
+    """
+
+    user = None
+
+    def __init__(self, origin):
+        self.origin = origin
+
+    def build_absolute_uri(self, location):
+        if location.startswith('/') and not location.startswith('//'):
+            return f'{self.origin}{location}'
+        return location
+
+
+class RecipeSnapshotStore:
+    """Хранилище закодированных в JSON публичных частей рецептов.
+
+    Снимок — это JSON рецепта, разрезанный на сегменты по местам флагов
+    пользователя и адреса сайта. Список рецептов собирается склейкой
+    сегментов с подставленными значениями, без сериализаторов DRF.
+    Ключ снимка включает версии рецепта, автора и справочника
+    ингредиентов, поэтому их изменение делает снимок устаревшим.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get_keys(self, recipes):
+        """Возвращает ключи кеша снимков по текущим версиям."""
+        names = [INGREDIENTS_VERSION]
+        for recipe in recipes:
+            names.append(recipe_version(recipe.id))
+            names.append(author_version(recipe.author_id))
+        versions = dict(zip(names, get_versions(*names)))
+        return {
+            recipe.id: SNAPSHOT_KEY.format(
+                recipe.id,
+                versions[recipe_version(recipe.id)],
+                versions[author_version(recipe.author_id)],
+                versions[INGREDIENTS_VERSION],
+            )
+            for recipe in recipes
+        }
+
+    def build(self, recipes):
+        """Сериализует рецепты и режет их JSON на сегменты."""
+        prefetch_related_objects(recipes, 'author', 'recipe_ingredients')
+        markers = {name: uuid.uuid4().hex for name in (*FLAGS, ORIGIN)}
+        slots = {f'"{markers[name]}"'.encode(): name for name in FLAGS}
+        slots[markers[ORIGIN].encode()] = ORIGIN
+        pattern = re.compile(b'(' + b'|'.join(map(re.escape, slots)) + b')')
+        data = dump(
+            RecipeSnapshotSerializer,
+            recipes,
+            {'request': SnapshotRequest(markers[ORIGIN]), 'slots': markers},
+            many=True,
+        )
+        snapshots = {}
+        for recipe, item in zip(recipes, data):
+            parts = pattern.split(encode_json(item))
+            snapshots[recipe.id] = (
+                tuple(parts[::2]),
+                tuple(slots[part] for part in parts[1::2]),
+            )
+        return snapshots
+
+    def get_many(self, recipes):
+        """Возвращает снимки рецептов, строя и сохраняя недостающие.
+
+        Версии читаются до построения, а увеличиваются после фиксации
+        изменений, поэтому старые данные не попадают под новый ключ.
+        """
+        keys = self.get_keys(recipes)
+        found = cache.get_many(keys.values())
+        snapshots = {
+            recipe_id: found[key]
+            for recipe_id, key in keys.items() if key in found
+        }
+        missing = [recipe for recipe in recipes if recipe.id not in snapshots]
+        if missing:
+            built = self.build(missing)
+            cache.set_many(
+                {keys[recipe_id]: item for recipe_id, item in built.items()},
+                self.timeout,
+            )
+            snapshots.update(built)
+        return snapshots
+
+    def refresh(self, recipe_ids):
+        """Строит и сохраняет снимки рецептов после их изменения.
+
+        Снимки строятся заново, даже если ключ уже есть в кеше:
+        его мог заполнить запрос, прочитавший строки до изменения.
+        """
+        recipes = list(Recipe.objects.filter(id__in=recipe_ids))
+        if not recipes:
+            return
+        keys = self.get_keys(recipes)
+        cache.set_many(
+            {
+                keys[recipe_id]: snapshot
+                for recipe_id, snapshot in self.build(recipes).items()
+            },
+            self.timeout,
+        )
+
+    def render(self, recipes, request, extra=None):
+        """Собирает рецепты страницы из снимков и флагов пользователя.
+
+        Флаги загружаются пакетно, см. api.loaders. Функция extra
+        возвращает дополнительные поля рецепта.
+        """
+        with serializer_timer():
+            loader = get_loader(request)
+            loader.prime_recipes(recipes)
+            origin = json.dumps(
+                f'{request.scheme}://{request.get_host()}'
+            )[1:-1].encode()
+            snapshots = self.get_many(recipes)
+            results = []
+            for recipe in recipes:
+                values = {
+                    name: VALUES[flag]
+                    for name, flag in loader.recipe_flags(recipe).items()
+                }
+                values[ORIGIN] = origin
+                segments, slots = snapshots[recipe.id]
+                chunks = [segments[0]]
+                for name, segment in zip(slots, segments[1:]):
+                    chunks.append(values[name])
+                    chunks.append(segment)
+                content = b''.join(chunks)
+                if extra is not None:
+                    content = (
+                        content[:-1] + b',' + encode_json(extra(recipe))[1:]
+                    )
+                results.append(RawJSON(content))
+            return results
+
+
+recipe_snapshots = RecipeSnapshotStore(settings.RECIPE_SNAPSHOT_TIMEOUT)
+
+
+class RecipeSnapshotMixin:
+    """Миксин вьюсета рецептов: списки собираются из снимков."""
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.get_paginated_response(self.render_recipes(page))
+
+    def render_recipes(self, recipes, extra=None):
+        """Возвращает рецепты страницы, собранные из снимков."""
+        return recipe_snapshots.render(recipes, self.request, extra)
@@ -0,0 +1,48 @@
+from django.core.files.storage import default_storage
+
+from api.cache import bump_author, bump_recipe
+from api.images import delete_variants, generate_variants
+from recipes.models import Recipe
+from tasks.queue import task
+from users.models import User
+
+
+@task()
+def generate_recipe_image_variants(recipe_id, name):
+    """Создает уменьшенные копии изображения рецепта и отмечает их."""
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None or recipe.image.name != name:
+        return
+    generate_variants(recipe.image)
+    Recipe.objects.filter(id=recipe_id, image=name).update(
+        image_variants_ready=True
+    )
+    bump_recipe(recipe)
+
+
+@task()
+def generate_avatar_variants(user_id, name):
+    """Создает уменьшенные копии аватара и отмечает их."""
+    user = User.objects.filter(id=user_id).first()
+    if user is None or user.avatar.name != name:
+        return
+    generate_variants(user.avatar)
+    User.objects.filter(id=user_id, avatar=name).update(
+        avatar_variants_ready=True
+    )
+    bump_author(user)
+
+
+@task()
+def delete_image(name):
+    """Удаляет замененное изображение и его уменьшенные копии.
+
+    Файл не удаляется, если на него еще ссылается рецепт или аватар,
+    например общее изображение тестовых данных.
+    """
+    if not name or Recipe.objects.filter(image=name).exists() or (
+        User.objects.filter(avatar=name).exists()
+    ):
+        return
+    delete_variants(name, default_storage)
+    default_storage.delete(name)
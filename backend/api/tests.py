@@ -0,0 +1,1762 @@
+import asyncio
+import base64
+import contextvars
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    transaction,
+)
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import yaml
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.async_views import async_view
+from api.cache import (
+    INGREDIENTS_VERSION,
+    RECIPES_VERSION,
+    author_version,
+    get_versions,
+    increment_versions,
+)
+from api.ingredient_catalog import ingredient_catalog
+from api.ingredient_index import ingredient_index
+from api.ingredient_matcher import IngredientMatcher, recipe_matcher
+from api.management.commands.benchmark import percentile
+from api.middleware import QueryBudgetExceeded
+from api.serializers import RecipePostSerializer
+from api.short_links import ShortLinkCache, short_link_cache
+from api.snapshots import recipe_snapshots
+from api.tasks import generate_recipe_image_variants
+from api.views import IngredientViewSet, RecipeViewSet
+from foodgram_backend.constants import TRENDING_SCORE_MIN
+from foodgram_backend.counters import (
+    change_counter,
+    change_counters,
+    reconcile_counters,
+)
+from foodgram_backend.db.pool import (
+    ConnectionPool,
+    PoolTimeout,
+    pools,
+    render_pools,
+)
+from recipes.bulk import bulk_add
+from recipes.feed import (
+    PULL_AUTHORS_KEY,
+    fan_out,
+    get_feed,
+    pull_author_ids,
+)
+from recipes.models import (
+    Favorite,
+    FeedEntry,
+    FeedPullAuthor,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeScore,
+    ShoppingCart,
+)
+from recipes.short_links import encode_base62
+from recipes.signals import bulk_created, recipe_ingredients_changed
+from tasks.queue import claim
+from users.models import Subscription, User
+
+
+SCHEMA_PATH = settings.BASE_DIR.parent / 'docs' / 'openapi-schema.yml'
+TYPES = {
+    'integer': lambda value: (
+        isinstance(value, int) and not isinstance(value, bool)
+    ),
+    'number': lambda value: (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+    ),
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: isinstance(value, bool),
+    'array': lambda value: isinstance(value, list),
+    'object': lambda value: isinstance(value, dict),
+}
+
+
+def validate(value, schema, components, location='$'):
+    """Проверяет значение по схеме OpenAPI и возвращает список ошибок.
+
+    Проверяются типы, обязательные и описанные в схеме свойства
+    объектов. Дополнительные свойства допускаются, ссылки (format uri)
+    могут быть null, если файл не загружен.
+    """
+    if '$ref' in schema:
+        schema = components[schema['$ref'].rsplit('/', 1)[-1]]
+    if value is None:
+        if schema.get('nullable') or schema.get('format') == 'uri':
+            return []
+        return [f'{location}: null']
+    kind = schema.get('type', 'object')
+    if not TYPES[kind](value):
+        return [f'{location}: expected {kind}, got {type(value).__name__}']
+    errors = []
+    if kind == 'array':
+        for index, item in enumerate(value):
+            errors += validate(
+                item, schema.get('items', {}), components,
+                f'{location}[{index}]',
+            )
+    elif kind == 'object':
+        for name, field in schema.get('properties', {}).items():
+            if name not in value:
+                errors.append(f'{location}.{name}: missing')
+            else:
+                errors += validate(
+                    value[name], field, components, f'{location}.{name}'
+                )
+    return errors
+
+
+def create_user(number):
+    return User.objects.create_user(
+        username=f'user{number}',
+        email=f'user{number}@example.com',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password',
+    )
+
+
+class ApiDataMixin:
+    """Данные для тестов API: авторы с рецептами, подписки и списки.
+
+    Первый пользователь подписан на остальных, у него есть рецепты
+    в избранном и в корзине. Кеш очищается перед каждым тестом, чтобы
+    справочники и версии не переходили из теста в тест.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(6)
+        ]
+        cls.reader, *cls.authors = [create_user(number) for number in range(4)]
+        cls.recipes = []
+        for number in range(8):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}',
+                text='Описание рецепта.',
+                cooking_time=10 + number,
+                image=f'recipes/images/recipe{number}.png',
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in cls.ingredients[number % 3:number % 3 + 3]
+            )
+            recipe_ingredients_changed.send(
+                sender=Recipe, recipe_id=recipe.id
+            )
+            cls.recipes.append(recipe)
+        for author in cls.authors:
+            Subscription.objects.create(subscriber=cls.reader, author=author)
+        for recipe in cls.recipes[:3]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.user = APIClient()
+        self.user.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+
+class IngredientIndexTests(TestCase):
+    """Индекс ингредиентов следует за общей версией справочника."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(ingredient_catalog, 'check_interval', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, prefix):
+        return [item['name'] for item in ingredient_index.search(prefix)]
+
+    def test_follows_changes_made_in_other_processes(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Мука', measurement_unit='г'),
+            Ingredient(name='Молоко', measurement_unit='мл'),
+        ])
+        self.assertEqual(self.names('му'), ['Мука'])
+        ingredient_index.render('му')
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Мускатный орех', measurement_unit='г'),
+        ])
+        self.assertEqual(self.names('му'), ['Мука'])
+        increment_versions([INGREDIENTS_VERSION])
+        self.assertEqual(self.names('му'), ['Мука', 'Мускатный орех'])
+        self.assertIn('Мускатный орех', ingredient_index.render('му').decode())
+
+    def test_local_changes_are_published_after_commit(self):
+        self.assertEqual(self.names('с'), [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        version, = get_versions(INGREDIENTS_VERSION)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_versions(INGREDIENTS_VERSION), [version])
+        self.assertEqual(self.names('с'), ['Соль'])
+
+
+class IngredientMatcherTests(TestCase):
+    """Изменения индекса подбора доходят до других процессов по журналу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password',
+        )
+        cls.flour, cls.milk, cls.egg = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (
+                ('Мука', 'г'), ('Молоко', 'мл'), ('Яйцо', 'шт')
+            )
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Смешать и обжарить.',
+            cooking_time=20, image='recipes/images/pancakes.png',
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=cls.recipe, ingredient=ingredient, amount=1
+            )
+            for ingredient in (cls.flour, cls.milk)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.writer = IngredientMatcher()
+        self.reader = IngredientMatcher()
+
+    def matches(self, *ingredients):
+        return self.reader.match([ingredient.id for ingredient in ingredients])
+
+    def test_changes_are_replayed_from_journal_after_commit(self):
+        self.writer.match([])
+        self.assertEqual(
+            self.matches(self.flour, self.milk), [(self.recipe.id, [])]
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=self.egg, amount=2
+            )
+            self.writer.update(
+                self.recipe.id, [self.flour.id, self.milk.id, self.egg.id]
+            )
+        self.assertEqual(
+            self.matches(self.flour, self.milk), [(self.recipe.id, [])]
+        )
+        for callback in callbacks:
+            callback()
+        with mock.patch.object(self.reader, 'build') as build:
+            self.assertEqual(self.matches(self.flour, self.milk), [])
+            self.assertEqual(
+                self.matches(self.flour, self.milk, self.egg),
+                [(self.recipe.id, [])],
+            )
+        build.assert_not_called()
+
+    def test_removal_is_published_after_commit(self):
+        self.assertEqual(
+            self.matches(self.flour, self.milk), [(self.recipe.id, [])]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=self.recipe).delete()
+            self.writer.remove(self.recipe.id)
+        self.assertEqual(self.matches(self.flour, self.milk), [])
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(ApiDataMixin, TestCase):
+    """Эндпоинты с бюджетом SQL-запросов укладываются в него."""
+
+    authenticated_only = {
+        'RecipeViewSet.feed', 'UserViewSet.me', 'UserViewSet.subscriptions',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.cold_start()
+
+    def cold_start(self):
+        """Очищает кеш, как будто все процессы только что запущены.
+
+        Индексы в памяти процесса строятся один раз: справочник
+        ингредиентов — при старте (api.ingredient_index.warm_up), индекс
+        подбора — при первом подборе, и в бюджет запроса не входят.
+        Снимки рецептов, множество популярных авторов и кешированные
+        ответы общие для процессов и входят в бюджет.
+        """
+        cache.clear()
+        ingredient_index.build()
+        recipe_matcher.build()
+
+    def budgeted_requests(self):
+        recipe, author = self.recipes[0], self.authors[0]
+        ingredient_ids = ','.join(
+            str(ingredient.id) for ingredient in self.ingredients[:3]
+        )
+        return [
+            ('RecipeViewSet.list', '/api/recipes/'),
+            ('RecipeViewSet.list', '/api/recipes/?is_favorited=1'),
+            ('RecipeViewSet.list', '/api/recipes/?is_in_shopping_cart=1'),
+            ('RecipeViewSet.list', f'/api/recipes/?author={author.id}'),
+            ('RecipeViewSet.retrieve', f'/api/recipes/{recipe.id}/'),
+            ('RecipeViewSet.search', '/api/recipes/search/?q=Рецепт'),
+            (
+                'RecipeViewSet.match',
+                f'/api/recipes/match/?ingredients={ingredient_ids}&missing=1',
+            ),
+            ('RecipeViewSet.feed', '/api/recipes/feed/'),
+            ('UserViewSet.list', '/api/users/'),
+            ('UserViewSet.retrieve', f'/api/users/{author.id}/'),
+            ('UserViewSet.me', '/api/users/me/'),
+            (
+                'UserViewSet.subscriptions',
+                '/api/users/subscriptions/?recipes_limit=2',
+            ),
+            ('IngredientViewSet.list', '/api/ingredients/?name=Ингр'),
+            (
+                'IngredientViewSet.retrieve',
+                f'/api/ingredients/{self.ingredients[0].id}/',
+            ),
+            ('short_url', f'/s/{recipe.short_link}/'),
+        ]
+
+    def test_every_budget_is_exercised(self):
+        self.assertEqual(
+            {endpoint for endpoint, _ in self.budgeted_requests()},
+            set(settings.QUERY_BUDGETS),
+        )
+
+    def test_endpoints_stay_within_budget(self):
+        for endpoint, url in self.budgeted_requests():
+            for name, client in (
+                ('user', self.user), ('anonymous', self.anonymous)
+            ):
+                if name == 'anonymous' and endpoint in self.authenticated_only:
+                    continue
+                with self.subTest(endpoint=endpoint, url=url, client=name):
+                    self.cold_start()
+                    response = client.get(url)
+                    self.assertLess(response.status_code, 400)
+                    self.assertEqual(
+                        response.wsgi_request.metrics_endpoint, endpoint
+                    )
+
+    def test_exceeded_budget_fails_request(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        with override_settings(QUERY_BUDGETS={'RecipeViewSet.retrieve': 1}):
+            with self.assertRaisesMessage(
+                QueryBudgetExceeded, 'RecipeViewSet.retrieve'
+            ), self.assertLogs('django.request', 'ERROR'):
+                self.user.get(url)
+
+    def test_exceeded_budget_is_logged_outside_strict_mode(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        with override_settings(
+            QUERY_BUDGETS={'RecipeViewSet.retrieve': 1},
+            QUERY_BUDGET_STRICT=False,
+        ), self.assertLogs('api.middleware', 'WARNING'):
+            response = self.user.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TASKS_EAGER=True)
+class FeedPullAuthorTests(ApiDataMixin, TestCase):
+    """Рецепты не пропадают из лент, когда автор теряет популярность."""
+
+    def feed(self):
+        return get_feed(self.reader.id, limit=len(self.recipes))
+
+    def test_author_leaving_pull_set_is_pushed_to_feeds(self):
+        expected = self.feed()
+        self.assertEqual(len(expected), len(self.recipes))
+        cache.delete(PULL_AUTHORS_KEY)
+        with mock.patch('recipes.feed.FEED_PULL_SUBSCRIBERS_MIN', 1):
+            self.assertEqual(
+                pull_author_ids(),
+                {author.id for author in self.authors},
+            )
+            FeedEntry.objects.all().delete()
+            self.assertEqual(self.feed(), expected)
+        cache.delete(PULL_AUTHORS_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(len(pull_author_ids()), len(self.authors))
+        self.assertFalse(FeedPullAuthor.objects.exists())
+        self.assertEqual(pull_author_ids(), frozenset())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            len(self.recipes),
+        )
+        self.assertEqual(self.feed(), expected)
+
+    def test_popular_author_is_not_pushed(self):
+        with mock.patch('recipes.feed.FEED_PULL_SUBSCRIBERS_MIN', 1):
+            pull_author_ids()
+            cache.delete(PULL_AUTHORS_KEY)
+            with self.captureOnCommitCallbacks(execute=True):
+                pull_author_ids()
+        self.assertEqual(
+            FeedPullAuthor.objects.count(), len(self.authors)
+        )
+
+
+class ImageVariantTaskTests(ApiDataMixin, TestCase):
+    """Готовые уменьшенные копии сразу видны в ответах веб-процессов."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.recipe = self.recipes[-1]
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), 'orange').save(buffer, 'PNG')
+        default_storage.save(
+            self.recipe.image.name, ContentFile(buffer.getvalue())
+        )
+
+    def variants(self, client):
+        response = client.get(f'/api/recipes/?author={self.recipe.author_id}')
+        return next(
+            recipe['image_variants']
+            for recipe in response.json()['results']
+            if recipe['id'] == self.recipe.id
+        )
+
+    def test_responses_switch_to_variants_after_task(self):
+        for client in (self.anonymous, self.user):
+            self.assertTrue(
+                self.variants(client)['thumbnail'].endswith(
+                    self.recipe.image.name
+                )
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_recipe_image_variants.function(
+                self.recipe.id, self.recipe.image.name
+            )
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image_variants_ready)
+        for client in (self.anonymous, self.user):
+            self.assertIn('/variants/', self.variants(client)['thumbnail'])
+
+
+class RecipeSnapshotTests(ApiDataMixin, TestCase):
+    """Снимки рецептов для списков."""
+
+    def test_refresh_replaces_cached_snapshot(self):
+        recipe = self.recipes[0]
+        key = recipe_snapshots.get_keys([recipe])[recipe.id]
+        cache.set(key, ((b'{}',), ()))
+        recipe_snapshots.refresh([recipe.id])
+        self.assertEqual(
+            cache.get(key), recipe_snapshots.build([recipe])[recipe.id]
+        )
+
+    def test_list_shows_update_after_commit(self):
+        recipe = self.recipes[-1]
+        url = f'/api/recipes/?author={recipe.author_id}'
+        self.assertEqual(
+            self.anonymous.get(url).json()['results'][0]['name'], recipe.name
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+            self.assertEqual(
+                self.anonymous.get(url).json()['results'][0]['name'],
+                'Рецепт 7',
+            )
+        for client in (self.anonymous, self.user):
+            self.assertEqual(
+                client.get(url).json()['results'][0]['name'],
+                'Новое название',
+            )
+
+
+@override_settings(QUERY_BUDGETS={})
+class ApiContractTests(ApiDataMixin, TestCase):
+    """Быстрый вывод совпадает с сериализаторами DRF и со спецификацией.
+
+    Каждый ответ запрашивается при включенной и выключенной настройке
+    FAST_SERIALIZERS с очисткой кеша между запросами, чтобы снимки
+    и закешированные ответы не переходили из одного режима в другой.
+    Бюджеты запросов проверяются в QueryBudgetTests.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(SCHEMA_PATH, encoding='utf-8') as file:
+            cls.schema = yaml.safe_load(file)
+
+    def fetch(self, client, method, path, data=None):
+        """Возвращает тела ответов в обоих режимах вывода."""
+        bodies = {}
+        for fast in (True, False):
+            cache.clear()
+            with override_settings(FAST_SERIALIZERS=fast), (
+                transaction.atomic()
+            ):
+                response = getattr(client, method)(path, data, format='json')
+                transaction.set_rollback(True)
+            self.assertLess(response.status_code, 300, response.content)
+            bodies[fast] = json.loads(response.content)
+        return bodies
+
+    def assert_matches(self, client, path, template=None, method='get',
+                       data=None, status='200'):
+        bodies = self.fetch(client, method, path, data)
+        self.assertEqual(bodies[True], bodies[False])
+        if template is None:
+            return
+        response = self.schema['paths'][template][method]['responses']
+        self.assertEqual(
+            validate(
+                bodies[True],
+                response[status]['content']['application/json']['schema'],
+                self.schema['components']['schemas'],
+            ),
+            [],
+        )
+
+    def test_documented_read_endpoints(self):
+        recipe, author = self.recipes[0], self.authors[0]
+        paths = [
+            ('/api/users/', '/api/users/'),
+            (f'/api/users/{author.id}/', '/api/users/{id}/'),
+            ('/api/users/me/', '/api/users/me/'),
+            ('/api/users/subscriptions/', '/api/users/subscriptions/'),
+            (
+                '/api/users/subscriptions/?recipes_limit=1',
+                '/api/users/subscriptions/',
+            ),
+            ('/api/recipes/', '/api/recipes/'),
+            ('/api/recipes/?is_favorited=1', '/api/recipes/'),
+            (f'/api/recipes/{recipe.id}/', '/api/recipes/{id}/'),
+            ('/api/ingredients/?name=Ингр', '/api/ingredients/'),
+            (
+                f'/api/ingredients/{self.ingredients[0].id}/',
+                '/api/ingredients/{id}/',
+            ),
+        ]
+        for path, template in paths:
+            with self.subTest(path=path):
+                self.assert_matches(self.user, path, template)
+        for path, template in paths[5:8]:
+            with self.subTest(path=path, client='anonymous'):
+                self.assert_matches(self.anonymous, path, template)
+
+    def test_snapshot_endpoints(self):
+        ingredient_ids = ','.join(
+            str(ingredient.id) for ingredient in self.ingredients[:3]
+        )
+        for path in (
+            '/api/recipes/search/?q=Рецепт',
+            '/api/recipes/feed/',
+            f'/api/recipes/match/?ingredients={ingredient_ids}&missing=2',
+        ):
+            with self.subTest(path=path):
+                self.assert_matches(self.user, path)
+
+    def test_batch_endpoints(self):
+        recipe_ids = [recipe.id for recipe in self.recipes[2:5]]
+        for path in (
+            '/api/recipes/favorite/', '/api/recipes/shopping_cart/'
+        ):
+            with self.subTest(path=path):
+                self.assert_matches(
+                    self.user, path, method='post',
+                    data={'recipes': recipe_ids},
+                )
+        other = APIClient()
+        other.force_authenticate(self.authors[0])
+        self.assert_matches(
+            other, '/api/users/subscribe/', method='post',
+            data={'authors': [author.id for author in self.authors[1:]]},
+        )
+
+
+class BulkAddTests(ApiDataMixin, TestCase):
+    """Пакетная вставка сообщает только о вставленных записях."""
+
+    def test_rows_added_concurrently_are_skipped(self):
+        recipes = self.recipes[3:6]
+        Favorite.objects.create(user=self.reader, recipe=recipes[1])
+        received = []
+
+        def receiver(objs, **kwargs):
+            received.extend(objs)
+
+        bulk_created.connect(receiver, sender=Favorite)
+        self.addCleanup(bulk_created.disconnect, receiver, sender=Favorite)
+        inserted = bulk_add(Favorite, [
+            Favorite(user=self.reader, recipe=recipe) for recipe in recipes
+        ])
+        self.assertEqual(
+            [favorite.recipe_id for favorite in inserted],
+            [recipes[0].id, recipes[2].id],
+        )
+        self.assertEqual(received, inserted)
+        self.assertEqual(
+            list(
+                Recipe.objects.filter(id__in=[r.id for r in recipes])
+                .order_by('id').values_list('favorites_count', flat=True)
+            ),
+            [1, 1, 1],
+        )
+
+    def test_other_integrity_errors_are_raised(self):
+        with self.assertRaises(IntegrityError):
+            bulk_add(Subscription, [
+                Subscription(subscriber=self.reader, author=self.reader)
+            ])
+
+
+class RecipeSearchTests(ApiDataMixin, TestCase):
+    """Полнотекстовый поиск рецептов."""
+
+    def ids(self, url):
+        response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_above_text_matches(self):
+        in_name, in_text = self.recipes[1], self.recipes[6]
+        in_name.name = 'Борщ'
+        in_name.save()
+        in_text.text = 'Подается к борщу.'
+        in_text.save()
+        self.assertEqual(
+            self.ids('/api/recipes/search/?q=борщ'), [in_name.id, in_text.id]
+        )
+
+    def test_list_filters_apply_to_results(self):
+        author = self.authors[1]
+        self.assertEqual(
+            set(self.ids(f'/api/recipes/search/?q=Рецепт&author={author.id}')),
+            {recipe.id for recipe in self.recipes if recipe.author == author},
+        )
+
+    def test_cursor_pages_follow_rank(self):
+        # Ссылка next строится из параметров запроса, поэтому они
+        # передаются закодированными, как их отправляет браузер.
+        query = urlencode({'q': 'Рецепт'})
+        expected = self.ids(f'/api/recipes/search/?{query}&limit=100')
+        self.assertEqual(len(expected), len(self.recipes))
+        url, ids = f'/api/recipes/search/?{query}&limit=3&cursor=', []
+        while url:
+            page = self.anonymous.get(url).json()
+            ids += [recipe['id'] for recipe in page['results']]
+            url = page['next']
+        self.assertEqual(ids, expected)
+
+    def test_query_without_words_is_rejected(self):
+        response = self.anonymous.get('/api/recipes/search/?q=%20-')
+        self.assertEqual(response.status_code, 400)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class KeysetPaginationTests(ApiDataMixin, TestCase):
+    """Пагинация по курсору для списков рецептов и пользователей."""
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.user.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ids += [item['id'] for item in page['results']]
+            url = page['next']
+        return ids
+
+    def page_ids(self, url):
+        return [item['id'] for item in self.user.get(url).json()['results']]
+
+    def test_cursor_pages_match_page_number_order(self):
+        for url in (
+            '/api/recipes/', '/api/users/', '/api/recipes/feed/',
+            '/api/recipes/?ordering=popular',
+        ):
+            with self.subTest(url=url):
+                separator = '&' if '?' in url else '?'
+                self.assertEqual(
+                    self.walk(f'{url}{separator}limit=3&cursor='),
+                    self.page_ids(f'{url}{separator}limit=100'),
+                )
+
+    def test_count_is_optional(self):
+        page = self.user.get('/api/recipes/?cursor=').json()
+        self.assertNotIn('count', page)
+        page = self.user.get('/api/recipes/?cursor=&with_count=1').json()
+        self.assertEqual(page['count'], len(self.recipes))
+
+    def assert_not_found(self, url, cursor, **params):
+        with self.subTest(url=url, cursor=cursor, **params), (
+            self.assertLogs('django.request', 'WARNING')
+        ):
+            response = self.user.get(url, {'cursor': cursor, **params})
+            self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor_is_not_found(self):
+        cursors = [
+            'not-base64!', encode_cursor({'a': 1}), encode_cursor([1]),
+            encode_cursor([None, 1]), encode_cursor([{'a': 1}, 1]),
+            encode_cursor(['вчера', 1]), encode_cursor([True, 1]),
+            encode_cursor(['2025-01-01T00:00:00+00:00', 'один']),
+        ]
+        for url in ('/api/recipes/', '/api/recipes/feed/'):
+            for cursor in cursors:
+                self.assert_not_found(url, cursor)
+        for cursor in (encode_cursor([None, 1]), encode_cursor([[], 1])):
+            self.assert_not_found('/api/recipes/', cursor, ordering='popular')
+            self.assert_not_found('/api/users/', cursor)
+
+
+class RecipeScoreOrderingTests(ApiDataMixin, TestCase):
+    """Сортировка рецептов по рейтингу популярности."""
+
+    def ids(self, url):
+        return [item['id'] for item in self.user.get(url).json()['results']]
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.user.get(url).json()
+            ids += [item['id'] for item in page['results']]
+            url = page['next']
+        return ids
+
+    def test_favorites_raise_popular_rank(self):
+        recipe = self.recipes[5]
+        for author in self.authors[:2]:
+            Favorite.objects.create(user=author, recipe=recipe)
+        self.assertEqual(
+            self.ids('/api/recipes/?ordering=popular&limit=4'),
+            [recipe.id] + [recipe.id for recipe in self.recipes[2::-1]],
+        )
+
+    def test_recipes_without_score_are_listed(self):
+        RecipeScore.objects.filter(recipe__in=self.recipes[3:6]).delete()
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                url = f'/api/recipes/?ordering={ordering}'
+                ids = self.ids(f'{url}&limit=100')
+                self.assertEqual(len(ids), len(self.recipes))
+                self.assertEqual(self.walk(f'{url}&limit=2&cursor='), ids)
+
+
+class BatchEndpointTests(ApiDataMixin, TestCase):
+    """Пакетные эндпоинты избранного, корзины и подписок."""
+
+    def batch(self, method, url, key, objs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.user, method)(
+                url, {key: [obj.id for obj in objs]}, format='json'
+            )
+
+    def count_queries(self, method, url, key, objs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(method, url, key, objs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            with self.subTest(url=url):
+                counts = {
+                    method: [
+                        self.count_queries(method, url, 'recipes', recipes)
+                        for recipes in (self.recipes[3:5], self.recipes[5:])
+                    ]
+                    for method in ('post', 'delete')
+                }
+                self.assertEqual(counts['post'][0], counts['post'][1])
+                self.assertEqual(counts['delete'][0], counts['delete'][1])
+        self.assertEqual(
+            self.count_queries(
+                'delete', '/api/users/subscribe/', 'authors', self.authors[:1]
+            ),
+            self.count_queries(
+                'delete', '/api/users/subscribe/', 'authors', self.authors[1:]
+            ),
+        )
+
+    def test_delete_updates_counters_scores_and_lists(self):
+        recipes = self.recipes[:3]
+        cart = self.user.get('/api/recipes/download_shopping_cart/')
+        self.assertTrue(b''.join(cart.streaming_content).strip())
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            response = self.batch('delete', url, 'recipes', recipes)
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(
+                Recipe.objects.filter(id__in=[r.id for r in recipes])
+                .values_list('favorites_count', 'shopping_carts_count')
+            ),
+            [(0, 0)] * len(recipes),
+        )
+        self.assertEqual(
+            set(
+                RecipeScore.objects.filter(recipe__in=recipes)
+                .values_list('popular', 'trending')
+            ),
+            {(0, TRENDING_SCORE_MIN)},
+        )
+        cart = self.user.get('/api/recipes/download_shopping_cart/')
+        self.assertFalse(b''.join(cart.streaming_content).strip())
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.batch(
+                'delete', '/api/recipes/favorite/', 'recipes', recipes
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsubscribe_updates_counters_and_feed(self):
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader).exists())
+        response = self.batch(
+            'delete', '/api/users/subscribe/', 'authors', self.authors
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(
+            set(
+                User.objects.filter(id__in=[a.id for a in self.authors])
+                .values_list('subscribers_count', flat=True)
+            ),
+            {0},
+        )
+
+
+class ResponseCacheTests(ApiDataMixin, TestCase):
+    """Кеш ответов анонимным пользователям с версиями и ETag."""
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.anonymous.get(url, **headers)
+
+    def etags(self):
+        return [
+            self.get(url)['ETag'] for url in (
+                '/api/recipes/', f'/api/recipes/{self.recipes[0].id}/'
+            )
+        ]
+
+    def test_not_modified_until_recipe_changes(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        etag = self.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].name = 'Новое название'
+            self.recipes[0].save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Новое название')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_author_change_invalidates_recipes(self):
+        etags = self.etags()
+        author = self.recipes[0].author
+        with self.captureOnCommitCallbacks(execute=True):
+            author.first_name = 'Другое'
+            author.save()
+        self.assertNotEqual(self.etags(), etags)
+        response = self.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.json()['author']['first_name'], 'Другое')
+
+    def test_login_does_not_invalidate_responses(self):
+        etags = self.etags()
+        author = self.recipes[0].author
+        versions = get_versions(RECIPES_VERSION, author_version(author.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post(
+                '/api/auth/token/login/',
+                {'email': author.email, 'password': 'password'},
+            )
+        self.assertEqual(response.status_code, 200)
+        author.refresh_from_db()
+        self.assertIsNotNone(author.last_login)
+        self.assertEqual(
+            get_versions(RECIPES_VERSION, author_version(author.id)),
+            versions,
+        )
+        self.assertEqual(self.etags(), etags)
+
+    def test_authenticated_responses_are_not_cached(self):
+        response = self.user.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertNotIn('ETag', response)
+
+
+class RecipeIngredientUpdateTests(ApiDataMixin, TestCase):
+    """Обновление состава рецепта меняет только отличающиеся строки."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.author = APIClient()
+        self.author.force_authenticate(self.recipe.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+        self.rows = {
+            item.ingredient_id: item
+            for item in self.recipe.recipe_ingredients.all()
+        }
+
+    def patch(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.author.patch(self.url, data, format='json')
+
+    def current(self):
+        return {
+            item.ingredient_id: (item.id, item.amount)
+            for item in self.recipe.recipe_ingredients.all()
+        }
+
+    def test_only_changed_rows_are_written(self):
+        kept, changed, removed = self.ingredients[:3]
+        added = self.ingredients[3]
+        response = self.patch({'name': 'Новое название', 'ingredients': [
+            {'id': kept.id, 'amount': self.rows[kept.id].amount},
+            {'id': changed.id, 'amount': 50},
+            {'id': added.id, 'amount': 7},
+        ]})
+        self.assertEqual(response.status_code, 200, response.content)
+        current = self.current()
+        self.assertEqual(set(current), {kept.id, changed.id, added.id})
+        self.assertEqual(
+            current[kept.id],
+            (self.rows[kept.id].id, self.rows[kept.id].amount),
+        )
+        self.assertEqual(current[changed.id], (self.rows[changed.id].id, 50))
+        self.assertEqual(current[added.id][1], 7)
+        self.assertFalse(
+            RecipeIngredient.objects.filter(id=self.rows[removed.id].id)
+            .exists()
+        )
+        self.assertEqual(
+            sorted(item['id'] for item in response.json()['ingredients']),
+            sorted(current),
+        )
+
+    def test_amount_change_keeps_rows_and_matcher(self):
+        ingredients = [
+            {'id': ingredient_id, 'amount': item.amount + 1}
+            for ingredient_id, item in self.rows.items()
+        ]
+        with mock.patch.object(recipe_matcher, 'update') as update:
+            response = self.patch({'ingredients': ingredients})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            {
+                ingredient_id: row_id
+                for ingredient_id, (row_id, _) in self.current().items()
+            },
+            {
+                ingredient_id: item.id
+                for ingredient_id, item in self.rows.items()
+            },
+        )
+        update.assert_not_called()
+
+    def test_ingredients_are_required(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.patch({'name': 'Без ингредиентов'})
+        self.assertEqual(response.status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Рецепт 0')
+        self.assertEqual(
+            self.current(),
+            {
+                ingredient_id: (item.id, item.amount)
+                for ingredient_id, item in self.rows.items()
+            },
+        )
+
+
+class FeedFanOutTests(ApiDataMixin, TestCase):
+    """Новый рецепт добавляется в ленты фоновой задачей."""
+
+    image = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa'
+        'AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQV'
+        'QImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+    )
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def test_new_recipe_is_fanned_out_by_worker(self):
+        author = APIClient()
+        author.force_authenticate(self.authors[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.post('/api/recipes/', {
+                'name': 'Новый рецепт',
+                'text': 'Описание.',
+                'cooking_time': 5,
+                'image': self.image,
+                'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe_id = response.json()['id']
+        entries = FeedEntry.objects.filter(recipe_id=recipe_id)
+        self.assertFalse(entries.exists())
+        tasks = [task for task in claim(10) if task.name == fan_out.name]
+        self.assertEqual([task.args for task in tasks], [[recipe_id]])
+        for _ in range(2):
+            fan_out.function(*tasks[0].args)
+        self.assertEqual(
+            get_feed(self.reader.id, limit=len(self.recipes) + 1)[0],
+            recipe_id,
+        )
+        self.assertEqual(entries.count(), 1)
+
+
+class RecipeIngredientValidationTests(ApiDataMixin, TestCase):
+    """Проверка ингредиентов рецепта по справочнику."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.author = APIClient()
+        self.author.force_authenticate(self.authors[0])
+
+    def post(self, ingredients):
+        return self.author.post('/api/recipes/', {
+            'name': 'Новый рецепт',
+            'text': 'Описание.',
+            'cooking_time': 5,
+            'image': FeedFanOutTests.image,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 1}
+                for ingredient_id in ingredients
+            ],
+        }, format='json')
+
+    def test_ingredient_deleted_after_catalog_check_is_rejected(self):
+        ingredient = self.ingredients[5]
+        patcher = mock.patch.object(ingredient_catalog, 'check_interval', 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ingredient_catalog.build()
+        # Ингредиент удален в другом процессе: справочник этого процесса
+        # узнает об этом при следующей сверке версии.
+        with mock.patch.object(ingredient_catalog, 'invalidate'):
+            Ingredient.objects.filter(id=ingredient.id).delete()
+        self.assertEqual(ingredient_catalog.unknown([ingredient.id]), set())
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.post([self.ingredients[0].id, ingredient.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'ingredients': [f'Ингредиенты не найдены: {ingredient.id}.']},
+        )
+        self.assertFalse(Recipe.objects.filter(name='Новый рецепт').exists())
+
+    def test_all_unknown_ingredients_are_reported(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.post([9999, self.ingredients[0].id, 9998])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'ingredients': ['Ингредиенты не найдены: 9998, 9999.']},
+        )
+
+    def test_duplicate_ingredients_are_rejected(self):
+        ingredient_id = self.ingredients[0].id
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.post([ingredient_id, ingredient_id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'non_field_errors': ['Ингредиенты должны быть уникальными.']},
+        )
+
+    def test_validation_uses_catalog(self):
+        ingredient_ids = [ingredient.id for ingredient in self.ingredients]
+        ingredient_catalog.invalidate()
+        with self.assertNumQueries(1):
+            self.assertEqual(ingredient_catalog.unknown(ingredient_ids), set())
+        data = {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 1}
+                for ingredient_id in ingredient_ids + [9999]
+            ],
+        }
+        serializer = RecipePostSerializer(data=data)
+        with self.assertNumQueries(0):
+            self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors['ingredients'],
+            ['Ингредиенты не найдены: 9999.'],
+        )
+
+
+class RequestFlagTests(ApiDataMixin, TestCase):
+    """Флаги пользователя загружаются пакетно для всей страницы."""
+
+    def count_queries(self, client, url):
+        cache.clear()
+        ingredient_index.build()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_flags_match_user_relations(self):
+        recipes = self.user.get('/api/recipes/?limit=100').json()['results']
+        favorited = {recipe.id for recipe in self.recipes[:3]}
+        for recipe in recipes:
+            with self.subTest(recipe=recipe['id']):
+                self.assertEqual(
+                    recipe['is_favorited'], recipe['id'] in favorited
+                )
+                self.assertEqual(
+                    recipe['is_in_shopping_cart'], recipe['id'] in favorited
+                )
+                self.assertTrue(recipe['author']['is_subscribed'])
+        other = APIClient()
+        other.force_authenticate(self.authors[0])
+        for recipe in other.get('/api/recipes/').json()['results']:
+            self.assertFalse(recipe['is_favorited'])
+            self.assertFalse(recipe['is_in_shopping_cart'])
+            self.assertFalse(recipe['author']['is_subscribed'])
+        users = other.get('/api/users/?limit=100').json()['results']
+        self.assertEqual(
+            [user['is_subscribed'] for user in users], [False] * len(users)
+        )
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for url in ('/api/recipes/', '/api/users/', '/api/recipes/feed/'):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(self.user, f'{url}?limit=2'),
+                    self.count_queries(self.user, f'{url}?limit=8'),
+                )
+
+
+class SubscriptionListTests(ApiDataMixin, TestCase):
+    """Список подписок строится в базе данных постранично."""
+
+    url = '/api/users/subscriptions/'
+
+    def test_page_contains_limited_recipes_of_each_author(self):
+        page = self.user.get(self.url, {'limit': 2, 'recipes_limit': 1})
+        page = page.json()
+        self.assertEqual(page['count'], len(self.authors))
+        self.assertIsNotNone(page['next'])
+        authors = sorted(self.authors, key=lambda author: author.username)
+        self.assertEqual(
+            [author['id'] for author in page['results']],
+            [author.id for author in authors[:2]],
+        )
+        for author in page['results']:
+            with self.subTest(author=author['id']):
+                own = [
+                    recipe for recipe in self.recipes
+                    if recipe.author_id == author['id']
+                ]
+                self.assertEqual(author['recipes_count'], len(own))
+                self.assertEqual(
+                    [recipe['id'] for recipe in author['recipes']],
+                    [own[-1].id],
+                )
+        page = self.user.get(self.url, {'limit': 10}).json()
+        self.assertEqual(
+            [len(author['recipes']) for author in page['results']],
+            [
+                sum(recipe.author_id == author.id for recipe in self.recipes)
+                for author in authors
+            ],
+        )
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        counts = []
+        for limit in (1, 3):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.user.get(
+                    self.url, {'limit': limit, 'recipes_limit': 2}
+                )
+            self.assertEqual(len(response.json()['results']), limit)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class ShoppingListTests(ApiDataMixin, TestCase):
+    """Выгрузка списка покупок в разных форматах с кешированием."""
+
+    url = '/api/recipes/download_shopping_cart/'
+    lines = [
+        'Ингредиент 0 - 1 (г)',
+        'Ингредиент 1 - 3 (г)',
+        'Ингредиент 2 - 6 (г)',
+        'Ингредиент 3 - 5 (г)',
+        'Ингредиент 4 - 3 (г)',
+    ]
+
+    def download(self, **params):
+        response = self.user.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_text_sums_amounts_by_ingredient(self):
+        self.assertEqual(self.download().split('\n'), self.lines)
+
+    def test_csv(self):
+        response = self.user.get(self.url, {'file_format': 'csv'})
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_list.csv"',
+        )
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode().splitlines()
+        ))
+        self.assertEqual(
+            rows[0], ['Ингредиент', 'Количество', 'Единица измерения']
+        )
+        self.assertEqual(
+            rows[1:],
+            [
+                [name, amount, 'г'] for name, amount in (
+                    line[:-4].split(' - ') for line in self.lines
+                )
+            ],
+        )
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.user.get(self.url, {'file_format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_is_cached_until_cart_recipe_changes(self):
+        self.download()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.download().split('\n'), self.lines)
+        recipe = self.recipes[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.recipe_ingredients.update(amount=10)
+            recipe.save()
+        self.assertEqual(
+            self.download().split('\n')[:3],
+            [
+                'Ингредиент 0 - 10 (г)',
+                'Ингредиент 1 - 12 (г)',
+                'Ингредиент 2 - 15 (г)',
+            ],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingCart.objects.filter(recipe=recipe).delete()
+        self.assertNotIn('Ингредиент 0', self.download())
+
+
+class LoadIngredientsTests(TestCase):
+    """Загрузка справочника ингредиентов из файлов."""
+
+    files = {
+        'ingredients.json': json.dumps([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'молоко', 'measurement_unit': 'мл'},
+            {'name': 'мука', 'measurement_unit': 'г'},
+        ], ensure_ascii=False),
+        'ingredients.csv': 'мука,г\nсоус "Тысяча островов",мл\n',
+        'ingredients.sql': (
+            'INSERT INTO recipes_ingredient (name, measurement_unit) VALUES '
+            "('мука', 'г'), ('чай ''Эрл Грей''', 'г');\n"
+        ),
+    }
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = {}
+        for name, content in self.files.items():
+            self.paths[name] = os.path.join(directory.name, name)
+            with open(self.paths[name], 'w', encoding='utf-8') as file:
+                file.write(content)
+
+    def load(self, name, *args):
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'load_ingredients', self.paths[name], *args, stdout=output
+            )
+        return output.getvalue()
+
+    def ingredients(self):
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_formats(self):
+        with mock.patch(
+            'recipes.management.commands.load_ingredients.CHUNK_SIZE', 7
+        ):
+            self.load('ingredients.json')
+        self.load('ingredients.csv')
+        self.load('ingredients.sql')
+        self.assertEqual(self.ingredients(), {
+            ('мука', 'г'),
+            ('молоко', 'мл'),
+            ('соус "Тысяча островов"', 'мл'),
+            ("чай 'Эрл Грей'", 'г'),
+        })
+
+    def test_unchanged_file_is_skipped(self):
+        version, = get_versions(INGREDIENTS_VERSION)
+        self.assertIn('Loaded 2 new', self.load('ingredients.json'))
+        self.assertNotEqual(get_versions(INGREDIENTS_VERSION), [version])
+        version, = get_versions(INGREDIENTS_VERSION)
+        with self.assertNumQueries(1):
+            self.assertIn('skipped', self.load('ingredients.json'))
+        self.assertIn('Loaded 0 new', self.load('ingredients.json', '--force'))
+        self.assertEqual(get_versions(INGREDIENTS_VERSION), [version])
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+class ShortLinkTests(ApiDataMixin, TestCase):
+    """Короткие ссылки на рецепты."""
+
+    def setUp(self):
+        super().setUp()
+        short_link_cache.links.clear()
+
+    def test_base62(self):
+        self.assertEqual(
+            [encode_base62(number) for number in (0, 9, 10, 61, 62, 3843)],
+            ['0', '9', 'a', 'Z', '10', 'ZZ'],
+        )
+        self.assertEqual(
+            len({encode_base62(number) for number in range(5000)}), 5000
+        )
+
+    def test_link_redirects_to_recipe(self):
+        recipe = self.recipes[0]
+        self.assertEqual(recipe.short_link, encode_base62(recipe.id))
+        response = self.anonymous.get(f'/api/recipes/{recipe.id}/get-link/')
+        self.assertEqual(
+            response.json(),
+            {'short-link': f'http://testserver/s/{recipe.short_link}/'},
+        )
+        response = self.anonymous.get(f'/s/{recipe.short_link}/')
+        self.assertRedirects(
+            response,
+            f'/api/recipes/{recipe.id}/',
+            fetch_redirect_response=False,
+        )
+        with self.assertNumQueries(0):
+            self.anonymous.get(f'/s/{recipe.short_link}/')
+
+    def test_deleted_recipe_link_is_not_found(self):
+        recipe = self.recipes[0]
+        self.anonymous.get(f'/s/{recipe.short_link}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.anonymous.get(f'/s/{recipe.short_link}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_least_recently_used_links_are_evicted(self):
+        links = ShortLinkCache(maxsize=2)
+        first, second, third = self.recipes[:3]
+        for recipe in (first, second, first, third):
+            links.resolve(recipe.short_link)
+        self.assertEqual(
+            list(links.links), [first.short_link, third.short_link]
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(links.resolve(first.short_link), first.id)
+        self.assertIsNone(links.resolve('нет'))
+
+
+@override_settings(QUERY_BUDGETS={})
+class BenchmarkCommandTests(TestCase):
+    """Команды seed_data и benchmark."""
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.directory = media.name
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        )
+
+    def seed(self, *args):
+        call_command(
+            'seed_data', '--users=4', '--recipes=10',
+            '--ingredients-per-recipe=3', '--favorites=2', '--carts=1',
+            '--subscriptions=2', *args, stdout=StringIO(),
+        )
+
+    def test_seed_data(self):
+        self.seed()
+        users = User.objects.filter(username__startswith='bench-')
+        recipes = Recipe.objects.filter(author__in=users)
+        self.assertEqual(users.count(), 4)
+        self.assertEqual(recipes.count(), 10)
+        self.assertEqual(
+            RecipeIngredient.objects.filter(recipe__in=recipes).count(), 30
+        )
+        for recipe in recipes:
+            self.assertEqual(recipe.short_link, encode_base62(recipe.id))
+        self.assertEqual(Favorite.objects.count(), 8)
+        self.assertEqual(ShoppingCart.objects.count(), 4)
+        self.assertEqual(Subscription.objects.count(), 8)
+        for user in users.all():
+            self.assertEqual(user.recipes_count, user.recipes.count())
+        self.assertFalse(
+            Subscription.objects.filter(subscriber=F('author')).exists()
+        )
+        self.seed()
+        self.assertEqual(users.count(), 8)
+        self.seed('--clear')
+        self.assertEqual(users.count(), 4)
+        self.assertEqual(Recipe.objects.count(), 10)
+
+    def test_seed_data_needs_ingredients(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'seed_data', '--ingredients-per-recipe=6', stdout=StringIO()
+            )
+
+    def test_benchmark_needs_data(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--requests=1', stdout=StringIO())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_benchmark_in_process(self):
+        self.seed()
+        output = os.path.join(self.directory, 'results.json')
+        stdout = StringIO()
+        call_command(
+            'benchmark', '--requests=30', '--warmup=5',
+            f'--output={output}', stdout=stdout,
+        )
+        with open(output, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(results['mode'], 'wsgi in-process')
+        self.assertEqual(results['requests'], 30)
+        self.assertEqual(
+            sum(stats['requests'] for stats in results['endpoints'].values()),
+            30,
+        )
+        for stats in results['endpoints'].values():
+            self.assertEqual(stats['errors'], 0)
+            self.assertIsNotNone(stats['mean_queries'])
+        call_command(
+            'benchmark', '--requests=30', '--warmup=5',
+            f'--compare={output}', stdout=stdout,
+        )
+        self.assertIn('Compared with', stdout.getvalue())
+
+
+class CounterTests(ApiDataMixin, TestCase):
+    """Денормализованные счетчики и их пересчет."""
+
+    def counts(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.favorites_count, recipe.shopping_carts_count
+
+    def test_fixture_counters(self):
+        for recipe in self.recipes:
+            self.assertEqual(self.counts(recipe), (
+                recipe.favorites.count(), recipe.shopping_carts.count()
+            ))
+        for author in self.authors:
+            author.refresh_from_db()
+            self.assertEqual(author.recipes_count, author.recipes.count())
+            self.assertEqual(author.subscribers_count, 1)
+
+    def test_endpoints_change_counters(self):
+        recipe = self.recipes[-1]
+        url = f'/api/recipes/{recipe.id}/'
+        self.user.post(f'{url}favorite/')
+        self.user.post(f'{url}shopping_cart/')
+        self.assertEqual(self.counts(recipe), (1, 1))
+        self.user.delete(f'{url}favorite/')
+        self.assertEqual(self.counts(recipe), (0, 1))
+        author = self.authors[0]
+        self.user.delete(f'/api/users/{author.id}/subscribe/')
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 0)
+
+    def test_save_keeps_counters(self):
+        recipe = self.recipes[0]
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.filter(recipe=recipe).delete()
+        stale.name = 'Новое название'
+        stale.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_change_counter_stays_non_negative(self):
+        recipe = self.recipes[-1]
+        change_counter(Recipe, recipe.id, 'favorites_count', -1)
+        self.assertEqual(self.counts(recipe), (0, 0))
+
+    def test_change_counters_groups_repeated_objects(self):
+        first, second = self.recipes[-2:]
+        with self.assertNumQueries(2):
+            change_counters(
+                Recipe, [first.id, first.id, second.id],
+                'favorites_count', 1,
+            )
+        self.assertEqual(self.counts(first), (2, 0))
+        self.assertEqual(self.counts(second), (1, 0))
+        change_counters(Recipe, [first.id], 'favorites_count', -3)
+        self.assertEqual(self.counts(first), (2, 0))
+
+    def test_reconcile_counters(self):
+        drifted = self.recipes[:2]
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in drifted]).update(
+            favorites_count=5
+        )
+        User.objects.filter(pk=self.authors[0].pk).update(recipes_count=0)
+        stdout = StringIO()
+        call_command('reconcile_counters', stdout=stdout)
+        self.assertIn('recipes.Recipe.favorites_count: 2 rows fixed',
+                      stdout.getvalue())
+        self.assertIn('users.User.recipes_count: 1 rows fixed',
+                      stdout.getvalue())
+        self.assertIn('users.User.subscribers_count: 0 rows fixed',
+                      stdout.getvalue())
+        for recipe in drifted:
+            self.assertEqual(self.counts(recipe), (1, 1))
+        author = User.objects.get(pk=self.authors[0].pk)
+        self.assertEqual(author.recipes_count, author.recipes.count())
+        self.assertEqual(reconcile_counters(apps, batch_size=1), {
+            counter: 0 for counter in (
+                'users.User.recipes_count',
+                'users.User.subscribers_count',
+                'recipes.Recipe.favorites_count',
+                'recipes.Recipe.shopping_carts_count',
+            )
+        })
+
+
+class AsyncViewTests(TestCase):
+    """Синхронные вьюхи в асинхронном режиме выполняются в пуле потоков."""
+
+    class Response:
+        rendered_in = None
+
+        def render(self):
+            self.rendered_in = threading.current_thread().name
+
+    def test_disabled_by_default(self):
+        def view(request):
+            return self.Response()
+
+        self.assertIs(async_view(view), view)
+        list_view = IngredientViewSet.as_view({'get': 'list'})
+        self.assertFalse(asyncio.iscoroutinefunction(list_view))
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_view_runs_in_pool(self):
+        variable = contextvars.ContextVar('variable')
+        calls = []
+
+        def view(request, pk):
+            calls.append(
+                (threading.current_thread().name, variable.get(), pk)
+            )
+            return self.Response()
+
+        async def call():
+            variable.set('значение')
+            return await async_view(view)(None, pk=1)
+
+        wrapped = async_view(view)
+        self.assertTrue(asyncio.iscoroutinefunction(wrapped))
+        self.assertEqual(wrapped.__name__, 'view')
+        response = asyncio.run(call())
+        name, value, pk = calls[0]
+        self.assertTrue(name.startswith('db'))
+        self.assertEqual((value, pk), ('значение', 1))
+        self.assertEqual(response.rendered_in, name)
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_viewset_routes(self):
+        for actions, expected in (
+            ({'get': 'list', 'post': 'create'}, True),
+            ({'get': 'retrieve', 'delete': 'destroy'}, True),
+            ({'post': 'favorite', 'delete': 'favorite'}, False),
+        ):
+            with self.subTest(actions=actions):
+                view = RecipeViewSet.as_view(actions)
+                self.assertEqual(
+                    asyncio.iscoroutinefunction(view), expected
+                )
+
+
+class FakeConnection:
+    """Соединение для тестов пула."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    """Пул соединений с БД."""
+
+    def make_pool(self, check=lambda connection: True, **kwargs):
+        kwargs.setdefault('size', 1)
+        return ConnectionPool(
+            check, lambda connection: not connection.closed, **kwargs
+        )
+
+    def test_connection_is_reused(self):
+        pool = self.make_pool()
+        connection = pool.get(FakeConnection)
+        pool.put(connection)
+        self.assertIs(pool.get(FakeConnection), connection)
+        stats = pool.stats()
+        self.assertEqual(
+            (stats['idle'], stats['in_use'], stats['checkouts']), (0, 1, 2)
+        )
+
+    def test_overflow_connections_are_closed(self):
+        pool = self.make_pool(max_overflow=1)
+        first, second = pool.get(FakeConnection), pool.get(FakeConnection)
+        pool.put(first)
+        pool.put(second)
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_timeout(self):
+        pool = self.make_pool(timeout=0.01)
+        pool.get(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.get(FakeConnection)
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waits']), (1, 0))
+
+    def test_waiting_thread_gets_returned_connection(self):
+        pool = self.make_pool(timeout=5)
+        connection = pool.get(FakeConnection)
+        received = []
+        thread = threading.Thread(
+            target=lambda: received.append(pool.get(FakeConnection))
+        )
+        thread.start()
+        while not pool.stats()['waiting']:
+            time.sleep(0.001)
+        pool.put(connection)
+        thread.join()
+        self.assertEqual(received, [connection])
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_failed_health_check_replaces_connection(self):
+        healthy = set()
+        pool = self.make_pool(check=lambda connection: connection in healthy)
+        broken = pool.get(FakeConnection)
+        pool.put(broken)
+        connection = pool.get(FakeConnection)
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+        pool.put(connection)
+        healthy.add(connection)
+        self.assertIs(pool.get(FakeConnection), connection)
+
+    def test_expired_and_unusable_connections_are_closed(self):
+        pool = self.make_pool(max_age=0)
+        connection = pool.get(FakeConnection)
+        pool.put(connection)
+        self.assertTrue(connection.closed)
+        pool = self.make_pool()
+        connection = pool.get(FakeConnection)
+        connection.close()
+        pool.put(connection)
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertIsNot(pool.get(FakeConnection), connection)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(timeout=0.01)
+
+        def connect():
+            raise OperationalError('connection refused')
+
+        with self.assertRaises(OperationalError):
+            pool.get(connect)
+        self.assertIsInstance(pool.get(FakeConnection), FakeConnection)
+
+    def test_render_pools(self):
+        pool = self.make_pool()
+        pool.get(FakeConnection)
+        with mock.patch.dict(pools, clear=True):
+            self.assertEqual(render_pools(), '')
+            pools['default'] = pool
+            metrics = render_pools()
+        self.assertIn('foodgram_db_pool_in_use{alias="default"} 1', metrics)
+        self.assertIn(
+            'foodgram_db_pool_checkouts_total{alias="default"} 1', metrics
+        )
+        self.assertIn(
+            'foodgram_db_pool_wait_seconds_count{alias="default"} 1', metrics
+        )
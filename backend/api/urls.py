@@ -1,7 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, UserViewSet
+from api.views import (
+    IngredientViewSet,
+    MetricsView,
+    RecipeViewSet,
+    UserViewSet,
+)
 
 app_name = 'api'
 
@@ -12,6 +17,7 @@ router_v1.register('recipes', RecipeViewSet, basename='recipe')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredient')
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
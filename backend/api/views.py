@@ -1,7 +1,5 @@
-from io import BytesIO
-
-from django.db.models import Count, Exists, OuterRef, Sum
-from django.http import HttpResponse
+from django.db.models import Exists, OuterRef
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserViewSet
@@ -10,20 +8,36 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (
     SAFE_METHODS,
     AllowAny,
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPagination
+from api.async_views import AsyncViewSetMixin, async_view
+from api.cache import AnonymousCacheMixin
+from api.fast_serializers import FastSerializerMixin, dump
+from api.filters import IngredientFilter, RecipeFilter, SCORE_ORDERINGS
+from api.ingredient_index import ingredient_index
+from api.ingredient_matcher import recipe_matcher
+from api.metrics import registry
+from api.pagination import CustomPagination, FeedPagination
 from api.permissions import IsAuthorOrReadOnly
+from api.shopping_list import RENDERERS, get_shopping_list
+from api.short_links import short_link_cache
+from api.snapshots import RecipeSnapshotMixin
+from api.tasks import delete_image
 from api.serializers import (
+    AuthorIdsSerializer,
     AvatarSerializer,
     FavoriteSerializer,
     IngredientSerializer,
+    MiniRecipeSerializer,
     RecipeGetSerializer,
+    RecipeMatchSerializer,
+    RecipeIdsSerializer,
     RecipePostSerializer,
     ShoppingCartSerializer,
     SubscriptionGetSerializer,
@@ -31,27 +45,56 @@ from api.serializers import (
     UserGetSerializer,
     UserPostSerializer,
 )
-from foodgram_backend.constants import ZERO
+from foodgram_backend.constants import (
+    INGREDIENTS_LIMIT_MAX,
+    MATCH_INGREDIENTS_MAX,
+    MATCH_MISSING_MAX,
+    ZERO,
+)
+from foodgram_backend.db.pool import render_pools
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
-    ShoppingCart, RecipeIngredient,
+    ShoppingCart,
 )
+from recipes.bulk import bulk_add, bulk_remove
+from recipes.feed import get_feed
+from recipes.search import search_recipes
 from users.models import Subscription, User
 
 
-class UserViewSet(DjoserViewSet):
+def sort_by_ids(queryset, ids):
+    """Возвращает объекты queryset в порядке списка ids."""
+    order = {pk: index for index, pk in enumerate(ids)}
+    return sorted(queryset, key=lambda obj: order[obj.id])
+
+
+def not_found_response(field, title, ids):
+    """Ответ 400 со списком не найденных id."""
+    return Response(
+        {field: ['{} не найдены: {}.'.format(
+            title, ', '.join(map(str, sorted(ids)))
+        )]},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+class UserViewSet(AsyncViewSetMixin, FastSerializerMixin, DjoserViewSet):
     """Вьюсет для кастомного пользователя."""
 
-    queryset = User.objects.annotate(recipes_count=Count('recipes'))
+    queryset = User.objects.order_by('username')
     serializer_class = UserPostSerializer
     pagination_class = CustomPagination
+    keyset_ordering = ('username', 'id')
+    fast_actions = ('list', 'retrieve', 'me', 'subscriptions')
 
     def get_serializer_class(self):
         """Возвращаеткласс сериализатора в зависимости от действия."""
         if self.action in ['list', 'retrieve', 'me']:
             return UserGetSerializer
+        if self.action == 'subscriptions':
+            return SubscriptionGetSerializer
         return super().get_serializer_class()
 
     @action(
@@ -63,10 +106,7 @@ class UserViewSet(DjoserViewSet):
     )
     def me(self, request):
         """Получить информацию о текущем пользователе."""
-        serializer = UserGetSerializer(
-            request.user,
-            context={'request': request}
-        )
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
@@ -87,7 +127,12 @@ class UserViewSet(DjoserViewSet):
     def delete_avatar(self, request, *args, **kwargs):
         """Удалить аватар пользователя."""
         user = self.request.user
-        user.avatar.delete()
+        if user.avatar:
+            name = user.avatar.name
+            user.avatar = None
+            user.avatar_variants_ready = False
+            user.save(update_fields=('avatar', 'avatar_variants_ready'))
+            delete_image.delay(name)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -99,13 +144,16 @@ class UserViewSet(DjoserViewSet):
     )
     def subscriptions(self, request):
         """Получить список подписок пользователя."""
-        user = request.user
-        subscriptions = Subscription.objects.filter(subscriber=user)
-        authors = [subscription.author for subscription in subscriptions]
-        pages = self.paginate_queryset(authors)
-        serializer = SubscriptionGetSerializer(
-            pages, many=True, context={'request': request}
+        authors = SubscriptionGetSerializer.prepare_queryset(
+            User.objects.filter(
+                id__in=Subscription.objects.filter(
+                    subscriber=request.user
+                ).values('author_id')
+            ).order_by('username'),
+            request
         )
+        pages = self.paginate_queryset(authors)
+        serializer = self.get_serializer(pages, many=True)
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -141,10 +189,67 @@ class UserViewSet(DjoserViewSet):
                 )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='subscribe',
+        url_name='subscribe-batch',
+    )
+    def subscribe_batch(self, request):
+        """Подписаться или отписаться от списка авторов.
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+        Авторы и имеющиеся подписки проверяются одним запросом, новые
+        подписки добавляются одной вставкой, удаляются одним DELETE.
+        """
+        serializer = AuthorIdsSerializer(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data['authors']
+        user = request.user
+        if request.method == 'DELETE':
+            if not bulk_remove(Subscription.objects.filter(
+                subscriber=user, author_id__in=author_ids
+            )):
+                return Response(
+                    {'errors': 'Вы не подписаны на этих авторов.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        authors = SubscriptionGetSerializer.prepare_queryset(
+            User.objects.filter(id__in=author_ids).annotate(
+                subscribed=Exists(Subscription.objects.filter(
+                    subscriber=user, author=OuterRef('pk')
+                ))
+            ),
+            request,
+        )
+        authors = sort_by_ids(authors, author_ids)
+        unknown = set(author_ids) - {author.id for author in authors}
+        if unknown:
+            return not_found_response('authors', 'Авторы', unknown)
+        bulk_add(Subscription, [
+            Subscription(subscriber=user, author=author)
+            for author in authors if not author.subscribed
+        ])
+        return Response(
+            dump(
+                SubscriptionGetSerializer,
+                authors,
+                {'request': request},
+                many=True,
+            ),
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class IngredientViewSet(
+    AsyncViewSetMixin, FastSerializerMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для работы с ингредиентами."""
 
+    fast_actions = ('retrieve',)
     pagination_class = None
     permission_classes = (AllowAny,)
     queryset = Ingredient.objects.all()
@@ -153,19 +258,51 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        """Возвращает ингредиенты из индекса в памяти без запросов к БД."""
+        limit = request.query_params.get('limit')
+        if limit and limit.isdigit():
+            limit = min(int(limit), INGREDIENTS_LIMIT_MAX)
+        else:
+            limit = None
+        return HttpResponse(
+            ingredient_index.render(
+                request.query_params.get('name', ''), limit
+            ),
+            content_type='application/json',
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    AsyncViewSetMixin,
+    AnonymousCacheMixin,
+    RecipeSnapshotMixin,
+    FastSerializerMixin,
+    viewsets.ModelViewSet,
+):
     """Вьюсет для работы с рецептами."""
 
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     queryset = (
         Recipe.objects
         .select_related('author')
-        .prefetch_related('recipe_ingredients__ingredient')
+        .prefetch_related('recipe_ingredients')
     )
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    snapshot_actions = ('list', 'search', 'feed', 'match')
+    fast_actions = ('retrieve',)
+
+    @property
+    def keyset_ordering(self):
+        """Ключ пагинации зависит от выбранной сортировки."""
+        if self.action == 'search':
+            return ('-search_rank', '-id')
+        ordering = self.request.query_params.get('ordering')
+        if ordering in SCORE_ORDERINGS:
+            return (f'-{ordering}_score', '-id')
+        return ('-created_at', '-id')
 
     def perform_create(self, serializer):
         """Сохраняет рецепт с указанием автора."""
@@ -242,32 +379,97 @@ class RecipeViewSet(viewsets.ModelViewSet):
             already_exists_message='{} уже добавлен.'
         )
 
+    def handle_batch(self, request, model):
+        """Добавляет или удаляет список рецептов в избранном или корзине.
+
+        Рецепты и уже добавленные из них проверяются одним запросом,
+        новые записи добавляются одной вставкой, удаляются одним DELETE.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        user = request.user
+        if request.method == 'DELETE':
+            if bulk_remove(model.objects.filter(
+                recipe_id__in=recipe_ids, user=user
+            )):
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response(
+                {'detail': 'Рецепты не добавлены'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipes = sort_by_ids(
+            Recipe.objects.only(
+                'id', 'name', 'image', 'image_variants_ready', 'cooking_time'
+            )
+            .filter(id__in=recipe_ids)
+            .annotate(added=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))),
+            recipe_ids,
+        )
+        unknown = set(recipe_ids) - {recipe.id for recipe in recipes}
+        if unknown:
+            return not_found_response('recipes', 'Рецепты', unknown)
+        bulk_add(model, [
+            model(user=user, recipe=recipe)
+            for recipe in recipes if not recipe.added
+        ])
+        return Response(
+            dump(
+                MiniRecipeSerializer,
+                recipes,
+                {'request': request},
+                many=True,
+            ),
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-batch',
+    )
+    def favorite_batch(self, request):
+        """Добавляет или удаляет список рецептов в избранном."""
+        return self.handle_batch(request, Favorite)
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping_cart-batch',
+    )
+    def shopping_cart_batch(self, request):
+        """Добавляет или удаляет список рецептов в списке покупок."""
+        return self.handle_batch(request, ShoppingCart)
+
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия."""
+        if self.action == 'match':
+            return RecipeMatchSerializer
         if self.request.method in SAFE_METHODS:
             return RecipeGetSerializer
         return RecipePostSerializer
 
     def get_queryset(self):
-        """Возвращает набор запросов рецептов с аннотациями."""
-        user = self.request.user
-        queryset = (
+        """Возвращает набор запросов рецептов.
+
+        Флаги избранного, корзины и подписки для страницы загружаются
+        сериализатором пакетно, см. api.loaders. Списки собираются
+        из снимков, автор и состав загружаются только для рецептов
+        без снимка, см. api.snapshots.
+        """
+        if self.action in self.snapshot_actions:
+            return Recipe.objects.all()
+        return (
             Recipe.objects
             .select_related('author')
             .prefetch_related('recipe_ingredients')
         )
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(recipe=OuterRef('pk'), user=user)
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        recipe=OuterRef('pk'), user=user
-                    )
-                ),
-            )
-        return queryset
 
     @action(
         methods=['GET'],
@@ -277,28 +479,131 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_name='download_shopping_cart',
     )
     def download_shopping_cart(self, request):
-        """Возвращает список покупок в виде текстового файла."""
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_carts__user=request.user
+        """Возвращает список покупок в виде файла.
+
+        Формат задается параметром file_format: txt (по умолчанию) или csv.
+        """
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in RENDERERS:
+            return Response(
+                {'detail': 'Неподдерживаемый формат файла.'},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(sum=Sum('amount'))
+        renderer, content_type = RENDERERS[file_format]
+        response = StreamingHttpResponse(
+            renderer(get_shopping_list(request.user)),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"'
         )
-        buffer = self.generate_shopping_list(ingredients)
-        return HttpResponse(buffer, content_type='text/plain')
-
-    def generate_shopping_list(self, ingredients):
-        """Создает список покупок в виде буфера BytesIO."""
-        shopping_list = '\n'.join(
-            f'{ingredient["ingredient__name"]} - {ingredient["sum"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            for ingredient in ingredients
+        return response
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[AllowAny],
+        url_path='search',
+        url_name='search',
+    )
+    def search(self, request):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам.
+
+        Результаты отсортированы по релевантности, фильтры списка
+        рецептов применяются к ним так же, как к списку.
+        """
+        queryset = search_recipes(
+            self.filter_queryset(self.get_queryset()),
+            request.query_params.get('q', ''),
         )
-        buffer = BytesIO()
-        buffer.write(shopping_list.encode('utf-8'))
-        buffer.seek(0)
-        return buffer
+        if queryset is None:
+            return Response(
+                {'q': ['Укажите поисковый запрос.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.render_recipes(page))
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='feed',
+        url_name='feed',
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь.
+
+        Страницы выдаются по курсору в порядке публикации, рецепты
+        страницы загружаются одним запросом.
+        """
+        paginator = FeedPagination()
+
+        def fetch(position, limit):
+            recipe_ids = get_feed(request.user.id, position, limit)
+            recipes = self.get_queryset().in_bulk(recipe_ids)
+            return [
+                recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes
+            ]
+
+        page = paginator.paginate_feed(fetch, request, self.get_queryset())
+        return paginator.get_paginated_response(self.render_recipes(page))
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[AllowAny],
+        url_path='match',
+        url_name='match',
+    )
+    def match(self, request):
+        """Подбирает рецепты по имеющимся ингредиентам.
+
+        Параметр ingredients — id ингредиентов через запятую или
+        повторяющийся, missing — сколько ингредиентов рецепта может
+        не хватать. Рецепты отсортированы по числу недостающих.
+        """
+        ingredient_ids = [
+            value
+            for values in request.query_params.getlist('ingredients')
+            for value in values.split(',') if value
+        ]
+        missing = request.query_params.get('missing', str(ZERO))
+        errors = {}
+        if not ingredient_ids or not all(
+            value.isdigit() for value in ingredient_ids
+        ):
+            errors['ingredients'] = ['Укажите id ингредиентов.']
+        elif len(set(ingredient_ids)) > MATCH_INGREDIENTS_MAX:
+            errors['ingredients'] = [
+                f'Не больше {MATCH_INGREDIENTS_MAX} ингредиентов.'
+            ]
+        if not missing.isdigit() or int(missing) > MATCH_MISSING_MAX:
+            errors['missing'] = [
+                f'Целое число от {ZERO} до {MATCH_MISSING_MAX}.'
+            ]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        matches = recipe_matcher.match(
+            [int(value) for value in ingredient_ids], int(missing)
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        results = []
+        for recipe_id, missing_ingredients in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.missing_ingredients = missing_ingredients
+                results.append(recipe)
+        return self.get_paginated_response(self.render_recipes(
+            results,
+            extra=lambda recipe: {
+                'missing_ingredients': recipe.missing_ingredients,
+            },
+        ))
 
     @action(
         methods=['GET'],
@@ -309,19 +614,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_short_link(self, request, pk):
         """Возвращает короткую ссылку на рецепт."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        rev_link = reverse('short_url', args=[recipe.pk])
+        short_link = get_object_or_404(
+            Recipe.objects.values_list('short_link', flat=True), pk=pk
+        )
+        rev_link = reverse('short_url', args=[short_link])
         return Response(
             {'short-link': request.build_absolute_uri(rev_link)},
             status=status.HTTP_200_OK
         )
 
 
+@async_view
 def short_url(request, short_link):
     """Редирект с короткой ссылки."""
-    link = request.build_absolute_uri()
-    recipe = get_object_or_404(Recipe, short_link=link)
+    recipe_id = short_link_cache.resolve(short_link)
+    if recipe_id is None:
+        raise Http404
     return redirect(
         'api:recipe-detail',
-        pk=recipe.id
+        pk=recipe_id
     )
+
+
+class MetricsView(APIView):
+    """Метрики процесса в формате Prometheus."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render() + render_pools(),
+            content_type='text/plain; version=0.0.4',
+        )
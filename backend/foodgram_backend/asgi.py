@@ -3,5 +3,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+from api.async_views import executor  # noqa: E402
+from api.ingredient_index import warm_up  # noqa: E402
+
+# Сервер может импортировать приложение внутри цикла событий,
+# где обращения к БД запрещены, поэтому индекс строится в пуле.
+executor.submit(warm_up)
@@ -1,10 +1,31 @@
 AMOUNT_INGREDIENTS_MAX = 10000  # 10 кг продукта
 AMOUNT_INGREDIENTS_MIN = 1
+BASE64_CHUNK_SIZE = 64 * 1024  # кратно 4 символам base64
+BATCH_IDS_MAX = 100  # id в одном пакетном запросе
 COOKING_TIME_MAX = 720  # 12 часов для рецепта
 COOKING_TIME_MIN = 1
+FAVORITE_SCORE_WEIGHT = 1
+FEED_BACKFILL_SIZE = 50  # рецептов автора при подписке
+FEED_BATCH_SIZE = 1000
+FEED_PULL_AUTHORS_TIMEOUT = 60  # секунд
+FEED_PULL_SUBSCRIBERS_MIN = 1000
 IMAGE = 33
+IMAGE_MAX_SIDE = 6000
+IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+INGREDIENT_INDEX_RESPONSES_MAX = 1024
+INGREDIENTS_LIMIT_MAX = 1000
+MATCH_INGREDIENTS_MAX = 50
+MATCH_MISSING_MAX = 5
 PAGE_SIZE = 6
+POPULAR_WINDOW_DAYS = 7
+SHOPPING_CART_SCORE_WEIGHT = 0.5
+SHORT_LINK_CACHE_SIZE = 10000
 TEXT_LENGTH_MAX = 254
 TEXT_LENGTH_MEDIUM = 150
 TEXT_LENGTH_MIN = 50
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_SCORE_MIN = -1e9  # у рецепта нет событий
 ZERO = 0
@@ -0,0 +1,91 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'subscribers_count', 'users.Subscription', 'author'),
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    (
+        'recipes.Recipe',
+        'shopping_carts_count',
+        'recipes.ShoppingCart',
+        'recipe',
+    ),
+)
+RECONCILE_BATCH_SIZE = 1000
+
+
+class CounterFieldsMixin:
+    """Миксин модели с денормализованными счетчиками.
+
+    При сохранении существующего объекта счетчики не перезаписываются
+    значениями из памяти: они изменяются только через change_counter.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик на delta, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """Изменяет счетчики объектов pks на delta за каждое вхождение.
+
+    Объекты с одинаковым числом вхождений обновляются одним запросом.
+    """
+    groups = defaultdict(list)
+    for pk, count in Counter(pks).items():
+        groups[count].append(pk)
+    for count, group in groups.items():
+        queryset = model.objects.filter(pk__in=group)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta * count})
+        queryset.update(**{field: F(field) + delta * count})
+
+
+def reconcile_counters(apps, batch_size=RECONCILE_BATCH_SIZE):
+    """Пересчитывает разошедшиеся счетчики по связанным таблицам.
+
+    Возвращает словарь с числом исправленных строк для каждого счетчика.
+    """
+    fixed = {}
+    for model_name, field, related_name, lookup in COUNTERS:
+        model = apps.get_model(model_name)
+        related = apps.get_model(related_name)
+        actual = Coalesce(
+            Subquery(
+                related.objects.filter(**{lookup: OuterRef('pk')})
+                .order_by()
+                .values(lookup)
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            0,
+        )
+        drifted = list(
+            model.objects.annotate(actual=actual)
+            .exclude(**{field: F('actual')})
+            .values_list('pk', flat=True)
+        )
+        for start in range(0, len(drifted), batch_size):
+            model.objects.filter(
+                pk__in=drifted[start:start + batch_size]
+            ).update(**{field: actual})
+        fixed[f'{model_name}.{field}'] = len(drifted)
+    return fixed
@@ -0,0 +1,265 @@
+import functools
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from django.utils.functional import cached_property
+
+from api.metrics import LATENCY_BUCKETS, Histogram
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """Свободное соединение не появилось за время ожидания."""
+
+
+class ConnectionPool:
+    """Пул соединений с БД, общий для потоков процесса.
+
+    Держит до size соединений и открывает еще до max_overflow сверх
+    него под пиковую нагрузку, лишние соединения закрываются при
+    возврате. Если все соединения заняты, поток ждет не дольше
+    timeout секунд. Соединения старше max_age закрываются, а при
+    health_checks перед выдачей проверяются запросом check.
+    """
+
+    def __init__(
+        self, check, reset, size, max_overflow=0, timeout=10,
+        max_age=None, health_checks=True,
+    ):
+        self.check = check
+        self.reset = reset
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_checks = health_checks
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.created = {}
+        self.opened = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.wait_time = Histogram(LATENCY_BUCKETS)
+
+    def get(self, connect):
+        """Выдает свободное соединение или открывает новое через connect."""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self.condition:
+                while (
+                    not self.idle
+                    and self.opened >= self.size + self.max_overflow
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'No free database connection in the pool '
+                            f'after {self.timeout}s.'
+                        )
+                    waited = True
+                    self.waiting += 1
+                    try:
+                        self.condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+                connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    self.opened += 1
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self.release()
+                    raise
+                with self.condition:
+                    self.created[connection] = time.monotonic()
+                break
+            if self.is_expired(connection):
+                self.discard(connection)
+                continue
+            if not self.health_checks or self.check(connection):
+                break
+            with self.condition:
+                self.health_check_failures += 1
+            self.discard(connection)
+        with self.condition:
+            self.checkouts += 1
+            self.waits += waited
+            self.wait_time.observe(time.perf_counter() - started)
+        return connection
+
+    def put(self, connection):
+        """Возвращает соединение в пул или закрывает его."""
+        reusable = not self.is_expired(connection) and self.reset(connection)
+        with self.condition:
+            if reusable and (self.opened <= self.size or self.waiting):
+                self.idle.append(connection)
+                self.condition.notify()
+                return
+        self.discard(connection)
+
+    def is_expired(self, connection):
+        """Проверяет, превысило ли соединение максимальный возраст."""
+        if self.max_age is None:
+            return False
+        created = self.created.get(connection, 0)
+        return time.monotonic() - created >= self.max_age
+
+    def discard(self, connection):
+        """Закрывает соединение и освобождает место в пуле."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.created.pop(connection, None)
+        self.release()
+
+    def release(self):
+        """Уменьшает число открытых соединений и будит ожидающий поток."""
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+    def stats(self):
+        """Возвращает текущее состояние и счетчики пула."""
+        with self.condition:
+            return {
+                'idle': len(self.idle),
+                'in_use': self.opened - len(self.idle),
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'health_check_failures': self.health_check_failures,
+                'wait_time': (
+                    list(self.wait_time.cumulative()),
+                    self.wait_time.sum,
+                    self.wait_time.count,
+                ),
+            }
+
+
+def get_pool(alias, check, reset, options, health_checks):
+    """Возвращает пул соединений алиаса БД, создавая его при первом вызове."""
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(
+                check,
+                reset,
+                size=options['SIZE'],
+                max_overflow=options.get('MAX_OVERFLOW', 0),
+                timeout=options.get('TIMEOUT', 10),
+                max_age=options.get('MAX_AGE'),
+                health_checks=health_checks,
+            )
+        return pools[alias]
+
+
+POOL_METRICS = (
+    ('idle', 'foodgram_db_pool_idle', 'gauge', 'Свободные соединения'),
+    ('in_use', 'foodgram_db_pool_in_use', 'gauge', 'Занятые соединения'),
+    ('waiting', 'foodgram_db_pool_waiting', 'gauge',
+     'Потоки, ожидающие соединение'),
+    ('checkouts', 'foodgram_db_pool_checkouts_total', 'counter',
+     'Выдано соединений'),
+    ('waits', 'foodgram_db_pool_waits_total', 'counter',
+     'Выдачи, которым пришлось ждать'),
+    ('timeouts', 'foodgram_db_pool_timeouts_total', 'counter',
+     'Превышения времени ожидания'),
+    ('health_check_failures', 'foodgram_db_pool_health_check_failures_total',
+     'counter', 'Соединения, не прошедшие проверку'),
+)
+WAIT_TIME_METRIC = 'foodgram_db_pool_wait_seconds'
+
+
+def render_pools():
+    """Возвращает метрики пулов соединений в формате Prometheus."""
+    with pools_lock:
+        stats = {alias: pool.stats() for alias, pool in sorted(pools.items())}
+    if not stats:
+        return ''
+    lines = []
+    for key, name, kind, description in POOL_METRICS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, values in stats.items():
+            lines.append(f'{name}{{alias="{alias}"}} {values[key]}')
+    lines.append(f'# HELP {WAIT_TIME_METRIC} Время ожидания соединения')
+    lines.append(f'# TYPE {WAIT_TIME_METRIC} histogram')
+    for alias, values in stats.items():
+        buckets, total, count = values['wait_time']
+        label = f'alias="{alias}"'
+        for bound, value in buckets:
+            lines.append(
+                f'{WAIT_TIME_METRIC}_bucket{{{label},le="{bound}"}} {value}'
+            )
+        lines.append(f'{WAIT_TIME_METRIC}_sum{{{label}}} {total}')
+        lines.append(f'{WAIT_TIME_METRIC}_count{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class PooledDatabaseWrapperMixin:
+    """Миксин бэкенда БД: пул соединений и проверка перед использованием.
+
+    Настраивается ключами DATABASES: POOL (SIZE, MAX_OVERFLOW, TIMEOUT,
+    MAX_AGE) включает пул при SIZE больше нуля, CONN_HEALTH_CHECKS
+    включает проверку постоянного соединения при первом обращении
+    в каждом запросе. Бэкенд определяет check_connection
+    и reset_connection для соединений своего драйвера.
+    """
+
+    health_check_done = False
+
+    @cached_property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('SIZE'):
+            return None
+        return get_pool(
+            self.alias,
+            self.check_connection,
+            self.reset_connection,
+            options,
+            self.settings_dict.get('CONN_HEALTH_CHECKS', False),
+        )
+
+    def get_new_connection(self, conn_params):
+        self.health_check_done = True
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        return self.pool.get(
+            functools.partial(super().get_new_connection, conn_params)
+        )
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.put(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
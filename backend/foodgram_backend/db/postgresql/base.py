@@ -0,0 +1,37 @@
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from foodgram_backend.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений и проверкой соединений."""
+
+    @staticmethod
+    def check_connection(connection):
+        """Проверяет, что соединение из пула еще работает."""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    @staticmethod
+    def reset_connection(connection):
+        """Откатывает незавершенную транзакцию перед возвратом в пул."""
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except base.Database.Error:
+            return False
+        return (
+            connection.info.transaction_status
+            == extensions.TRANSACTION_STATUS_IDLE
+        )
@@ -32,9 +32,11 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'tasks.apps.TasksConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,18 +65,69 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
+ASGI_APPLICATION = 'foodgram_backend.asgi.application'
+
+# Асинхронные вьюхи для горячих эндпоинтов чтения включаются в asgi.py.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
+# Постоянные соединения живут CONN_MAX_AGE секунд и проверяются перед
+# первым использованием в запросе. При DB_POOL_SIZE больше нуля
+# соединения берутся из пула процесса и возвращаются в него в конце
+# запроса, а CONN_MAX_AGE ограничивает их возраст.
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', 60))
+CONN_HEALTH_CHECKS = (
+    os.getenv('CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.sqlite3')
+if DB_ENGINE == 'django.db.backends.postgresql':
+    DB_ENGINE = 'foodgram_backend.db.postgresql'
 
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.sqlite3'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default=(BASE_DIR / 'db.sqlite3')),
         'USER': os.getenv('POSTGRES_USER', default=None),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default=None),
         'HOST': os.getenv('DB_HOST', default=None),
         'PORT': os.getenv('DB_PORT', default=None),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': CONN_HEALTH_CHECKS,
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', 0)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_AGE': CONN_MAX_AGE or None,
+        },
+    }
+}
+
+# Счетчики версий в кеше сбрасывают закешированные ответы и справочники
+# в памяти всех процессов, поэтому при нескольких процессах и отдельном
+# обработчике очереди нужен общий кеш, например PyMemcacheCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
     }
 }
 
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+# Вывод ответов на чтение по планам сериализаторов, см.
+# api.fast_serializers.
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', 'True').lower() == 'true'
+RECIPE_SNAPSHOT_TIMEOUT = int(
+    os.getenv('RECIPE_SNAPSHOT_TIMEOUT', 24 * 60 * 60)
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,12 +160,27 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+
+# Фоновые задачи выполняет manage.py run_worker. При TASKS_EAGER
+# они выполняются в процессе запроса после фиксации транзакции.
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False').lower() == 'true'
+TASK_WORKER_CONCURRENCY = int(os.getenv('TASK_WORKER_CONCURRENCY', 2))
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 1))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 5))
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', 10))
+TASK_LOCK_TIMEOUT = int(os.getenv('TASK_LOCK_TIMEOUT', 10 * 60))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.RawJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
@@ -136,6 +204,28 @@ DJOSER = {
     }
 }
 
+# Число запросов при пустом общем кеше (снимки рецептов, множество
+# популярных авторов) и построенных индексах в памяти процесса.
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 9,
+    'RecipeViewSet.retrieve': 7,
+    'RecipeViewSet.search': 8,
+    'RecipeViewSet.match': 7,
+    'RecipeViewSet.feed': 9,
+    'UserViewSet.list': 4,
+    'UserViewSet.retrieve': 3,
+    'UserViewSet.me': 2,
+    'UserViewSet.subscriptions': 4,
+    'IngredientViewSet.list': 2,
+    'IngredientViewSet.retrieve': 2,
+    'short_url': 1,
+}
+QUERY_BUDGET_STRICT = (
+    os.getenv('QUERY_BUDGET_STRICT', str('test' in sys.argv)).lower() == 'true'
+)
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+DB_LOG_LEVEL = os.getenv('DB_LOG_LEVEL', 'INFO')
 
 LOGGING = {
     'version': 1,
@@ -152,13 +242,13 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
             'stream': sys.stdout,
         },
         'file': {
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
             'formatter': 'verbose',
@@ -167,12 +257,12 @@ LOGGING = {
     'loggers': {
         'django': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': True,
         },
         'django.db.backends': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': DB_LOG_LEVEL,
         },
     },
 }
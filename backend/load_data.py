@@ -1,23 +1,17 @@
 import os
-import json
-import django
-from recipes.models import Ingredient
-
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
-django.setup()
 
-
-def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as jsonfile:
-        data = json.load(jsonfile)
-        for item in data:
-            Ingredient.objects.get_or_create(**item)
+import django
+from django.core.management import call_command
 
 
 def main():
-    file_path = os.getenv('DATA_FILE', 'data/ingredients.json')
-    load_json(file_path)
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings'
+    )
+    django.setup()
+    call_command(
+        'load_ingredients', os.getenv('DATA_FILE', 'data/ingredients.json')
+    )
 
 
 if __name__ == '__main__':
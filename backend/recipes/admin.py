@@ -7,6 +7,7 @@ from recipes.models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from recipes.signals import recipe_ingredients_changed
 
 
 class OptimizedQuerysetMixin:
@@ -35,13 +36,28 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
         'author',
+        'favorites_count',
     )
+    readonly_fields = ('favorites_count', 'shopping_carts_count')
     search_fields = ('name',)
     list_filter = (
         'author__username',
     )
     inlines = (RecipeIngredientInline,)
 
+    def save_model(self, request, obj, form, change):
+        """Сбрасывает готовность уменьшенных копий при замене изображения."""
+        if 'image' in form.changed_data:
+            obj.image_variants_ready = False
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет ингредиенты и сообщает об изменении состава."""
+        super().save_related(request, form, formsets, change)
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe_id=form.instance.id
+        )
+
     def get_queryset(self, request):
         """Возвращает оптимизированный queryset для списка рецептов."""
         queryset = super().get_queryset(request)
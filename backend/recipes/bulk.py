@@ -0,0 +1,76 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q, UniqueConstraint
+
+from recipes.signals import bulk_created, bulk_deleted
+
+
+def unique_key(model):
+    """Возвращает поля (attname) уникального ограничения модели."""
+    constraint = next(
+        constraint for constraint in model._meta.constraints
+        if isinstance(constraint, UniqueConstraint)
+    )
+    return tuple(
+        model._meta.get_field(name).attname for name in constraint.fields
+    )
+
+
+def exclude_existing(model, objs, key):
+    """Убирает записи, которые уже есть в базе."""
+    query = Q()
+    for obj in objs:
+        query |= Q(**{field: getattr(obj, field) for field in key})
+    existing = set(model.objects.filter(query).values_list(*key))
+    return [
+        obj for obj in objs
+        if tuple(getattr(obj, field) for field in key) not in existing
+    ]
+
+
+def bulk_add(model, objs):
+    """Вставляет записи одним запросом и отправляет сигнал bulk_created.
+
+    Записи, уже существующие в базе, пропускаются. Если запись успели
+    добавить параллельно после проверки во вьюхе, вставка откатывается
+    до точки сохранения, существующие записи перечитываются и вставка
+    повторяется, поэтому сигнал получают только вставленные записи.
+    bulk_create не отправляет post_save, поэтому счетчики, рейтинги
+    и ленты обновляют пакетные обработчики bulk_created. Возвращает
+    вставленные записи.
+    """
+    key = unique_key(model)
+    with transaction.atomic():
+        while objs:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(objs)
+                break
+            except IntegrityError:
+                remaining = exclude_existing(model, objs, key)
+                if len(remaining) == len(objs):
+                    raise
+                objs = remaining
+        if objs:
+            bulk_created.send(sender=model, objs=objs)
+    return objs
+
+
+def bulk_remove(queryset):
+    """Удаляет записи одним запросом и отправляет сигнал bulk_deleted.
+
+    QuerySet.delete() при подключенных обработчиках post_delete читает
+    записи и отправляет сигнал для каждой, поэтому записи выбираются
+    с блокировкой и удаляются одним DELETE без сигналов, а счетчики,
+    рейтинги и ленты обновляют пакетные обработчики bulk_deleted.
+    Подходит только для моделей, на которые никто не ссылается.
+    Возвращает удаленные записи.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        objs = list(queryset.select_for_update())
+        if objs:
+            model.objects.filter(
+                pk__in=[obj.pk for obj in objs]
+            )._raw_delete(queryset.db)
+            bulk_deleted.send(sender=model, objs=objs)
+    return objs
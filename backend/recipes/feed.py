@@ -0,0 +1,250 @@
+import heapq
+
+from django.core.cache import cache
+from django.db.models import BooleanField, Q, Value
+from django.utils.timezone import now
+
+from foodgram_backend.constants import (
+    FEED_BACKFILL_SIZE,
+    FEED_BATCH_SIZE,
+    FEED_PULL_AUTHORS_TIMEOUT,
+    FEED_PULL_SUBSCRIBERS_MIN,
+)
+from recipes.models import FeedEntry, FeedPullAuthor, Recipe
+from tasks.queue import task
+from users.models import Subscription, User
+
+PULL_AUTHORS_KEY = 'feed:pull_authors'
+
+
+def pull_author_ids():
+    """Возвращает id популярных авторов, рецепты которых читаются из Recipe.
+
+    Копировать рецепт автора с FEED_PULL_SUBSCRIBERS_MIN подписчиками
+    в каждую ленту дорого, поэтому такие рецепты добавляются в ленту
+    при чтении. Множество хранится в FeedPullAuthor, сверяется с числом
+    подписчиков и кешируется на FEED_PULL_AUTHORS_TIMEOUT секунд.
+    """
+    return cache.get_or_set(
+        PULL_AUTHORS_KEY, sync_pull_authors, FEED_PULL_AUTHORS_TIMEOUT
+    )
+
+
+def sync_pull_authors():
+    """Сверяет множество популярных авторов с числом подписчиков.
+
+    Новые популярные авторы добавляются сразу. Автор, у которого стало
+    меньше FEED_PULL_SUBSCRIBERS_MIN подписчиков, остается в множестве,
+    пока фоновая задача не скопирует его рецепты в ленты: иначе рецепты,
+    опубликованные, пока ленты читали их из Recipe, пропали бы из лент.
+    Оба множества читаются одним запросом.
+    """
+    rows = User.objects.filter(
+        subscribers_count__gte=FEED_PULL_SUBSCRIBERS_MIN
+    ).annotate(
+        stored=Value(False, output_field=BooleanField())
+    ).order_by().values_list('id', 'stored').union(
+        FeedPullAuthor.objects.annotate(
+            stored=Value(True, output_field=BooleanField())
+        ).values_list('author_id', 'stored')
+    )
+    popular, stored = set(), set()
+    for author_id, is_stored in rows:
+        (stored if is_stored else popular).add(author_id)
+    FeedPullAuthor.objects.bulk_create(
+        [
+            FeedPullAuthor(author_id=author_id)
+            for author_id in popular - stored
+        ],
+        ignore_conflicts=True,
+    )
+    for author_id in stored - popular:
+        push_author.delay(author_id)
+    return frozenset(popular | stored)
+
+
+def copy_recipes(author_id, subscriber_ids, recipes):
+    """Добавляет рецепты автора в ленты подписчиков.
+
+    recipes — пары (id, дата публикации). Возвращает число строк.
+    """
+    return len(FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=subscriber_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                created_at=created_at,
+            )
+            for recipe_id, created_at in recipes
+            for subscriber_id in subscriber_ids
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    ))
+
+
+@task()
+def push_author(author_id):
+    """Переводит автора, переставшего быть популярным, на рассылку.
+
+    Последние рецепты копируются в ленты всех подписчиков, затем автор
+    удаляется из FeedPullAuthor. Рецепты, опубликованные во время
+    копирования, копируются вторым проходом.
+    """
+    if User.objects.filter(
+        id=author_id, subscribers_count__gte=FEED_PULL_SUBSCRIBERS_MIN
+    ).exists():
+        return
+    subscriber_ids = list(
+        Subscription.objects.filter(author_id=author_id)
+        .values_list('subscriber_id', flat=True)
+    )
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'created_at'
+    )
+    started = now()
+    copy_recipes(author_id, subscriber_ids, recipes[:FEED_BACKFILL_SIZE])
+    FeedPullAuthor.objects.filter(author_id=author_id).delete()
+    cache.delete(PULL_AUTHORS_KEY)
+    copy_recipes(
+        author_id, subscriber_ids, recipes.filter(created_at__gte=started)
+    )
+
+
+@task()
+def fan_out(recipe_id):
+    """Добавляет новый рецепт в ленты подписчиков автора.
+
+    Выполняется в обработчике задач: у автора может быть почти
+    FEED_PULL_SUBSCRIBERS_MIN подписчиков. Повторный запуск безопасен.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).values_list(
+        'author_id', 'created_at'
+    ).first()
+    if recipe is None:
+        return
+    author_id, created_at = recipe
+    if author_id in pull_author_ids():
+        return
+    subscriber_ids = Subscription.objects.filter(
+        author_id=author_id
+    ).values_list('subscriber_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=subscriber_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                created_at=created_at,
+            )
+            for subscriber_id in subscriber_ids.iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(subscriber_id, author_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    if author_id in pull_author_ids():
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'created_at'
+    )[:FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=subscriber_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                created_at=created_at,
+            )
+            for recipe_id, created_at in recipes
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def remove(subscriber_id, author_id):
+    """Удаляет рецепты автора из ленты отписавшегося пользователя."""
+    remove_many([(subscriber_id, author_id)])
+
+
+def remove_many(subscriptions):
+    """Удаляет рецепты авторов из лент подписчиков одним запросом.
+
+    subscriptions — пары (id подписчика, id автора).
+    """
+    if not subscriptions:
+        return
+    query = Q()
+    for subscriber_id, author_id in subscriptions:
+        query |= Q(user_id=subscriber_id, author_id=author_id)
+    FeedEntry.objects.filter(query).delete()
+
+
+def rebuild():
+    """Заполняет ленты заново по подпискам и последним рецептам авторов."""
+    FeedEntry.objects.all().delete()
+    FeedPullAuthor.objects.all().delete()
+    cache.delete(PULL_AUTHORS_KEY)
+    pulled = pull_author_ids()
+    author_ids = Subscription.objects.exclude(
+        author_id__in=pulled
+    ).values_list('author_id', flat=True).order_by().distinct()
+    created = 0
+    for author_id in author_ids.iterator():
+        subscriber_ids = list(
+            Subscription.objects.filter(author_id=author_id)
+            .values_list('subscriber_id', flat=True)
+        )
+        recipes = Recipe.objects.filter(author_id=author_id).values_list(
+            'id', 'created_at'
+        )[:FEED_BACKFILL_SIZE]
+        created += copy_recipes(author_id, subscriber_ids, recipes)
+    return created
+
+
+def after(position, created_at_field, id_field):
+    """Условие «после позиции» для порядка (-created_at, -id)."""
+    created_at, pk = position
+    return Q(**{f'{created_at_field}__lt': created_at}) | Q(**{
+        created_at_field: created_at, f'{id_field}__lt': pk,
+    })
+
+
+def get_feed(user_id, position=None, limit=None):
+    """Возвращает id рецептов ленты в порядке (-created_at, -id).
+
+    Лента собирается слиянием строк FeedEntry пользователя и рецептов
+    популярных авторов, на которых он подписан. Из каждого источника
+    читается не больше limit строк по индексу, начиная с позиции
+    (created_at, id) последнего рецепта предыдущей страницы.
+    """
+    sources = [FeedEntry.objects.filter(user_id=user_id)]
+    pulled = pull_author_ids()
+    if pulled:
+        author_ids = list(
+            Subscription.objects.filter(
+                subscriber_id=user_id, author_id__in=pulled
+            ).values_list('author_id', flat=True)
+        )
+        if author_ids:
+            sources.append(Recipe.objects.filter(author_id__in=author_ids))
+    pages = []
+    for queryset in sources:
+        id_field = 'recipe_id' if queryset.model is FeedEntry else 'id'
+        if position is not None:
+            queryset = queryset.filter(after(position, 'created_at', id_field))
+        pages.append(
+            queryset.order_by('-created_at', f'-{id_field}')
+            .values_list('created_at', id_field)[:limit]
+        )
+    seen = set()
+    recipe_ids = []
+    for _, recipe_id in heapq.merge(*pages, reverse=True):
+        if recipe_id not in seen:
+            seen.add(recipe_id)
+            recipe_ids.append(recipe_id)
+    return recipe_ids[:limit]
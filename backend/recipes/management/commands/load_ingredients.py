@@ -1,35 +1,169 @@
+import csv
+import hashlib
+import io
 import json
 import os
+import re
+import time
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.models import DatasetImport, Ingredient
+from recipes.signals import ingredients_loaded
 
-class Command(BaseCommand):
-    help = 'Load ingredients from a JSON file'
+DEFAULT_PATH = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), '../../../data/ingredients.json'
+    )
+)
+CHUNK_SIZE = 64 * 1024
+SQL_VALUE = re.compile(r"\('((?:[^']|'')*)',\s*'((?:[^']|'')*)'\)")
 
-    def handle(self, *args, **options):
-        json_path = os.path.join(os.path.dirname(__file__),
-                                 '../../../data/ingredients.json')
-        json_path = os.path.abspath(json_path)
 
-        try:
-            with open(json_path, encoding='utf-8') as f:
-                data = json.load(f)
+def read_json(file):
+    """Построчно разбирает JSON-массив объектов, не загружая его целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] in ('', ']'):
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+    if buffer[position:].strip(' \t\r\n,') not in ('', ']'):
+        raise CommandError('Malformed JSON at the end of the file')
 
-            for item in data:
-                Ingredient.objects.get_or_create(**item)
 
-            self.stdout.write(self.style.SUCCESS(
-                f'Successfully loaded {len(data)} ingredients.')
-            )
+def read_csv(file):
+    """Построчно читает CSV без заголовка: название, единица измерения."""
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_sql(file):
+    """Извлекает значения из INSERT-скрипта data/sql/ingredients.sql."""
+    for line in file:
+        for name, measurement_unit in SQL_VALUE.findall(line):
+            yield name.replace("''", "'"), measurement_unit.replace("''", "'")
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+    '.sql': read_sql,
+}
+
+
+def file_checksum(path):
+    """Считает контрольную сумму файла."""
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
 
+
+def copy_ingredients(rows):
+    """Загружает ингредиенты через COPY во временную таблицу (PostgreSQL)."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE ingredient_import '
+            '(name varchar(150), measurement_unit varchar(50)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT DO NOTHING'
+        )
+
+
+class Command(BaseCommand):
+    help = 'Load ingredients from a JSON, CSV or SQL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Path to ingredients.json, ingredients.csv or ingredients.sql'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows per INSERT'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Load the file even if its checksum has not changed'
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError(f'Unsupported file format: {path}')
+        started = time.perf_counter()
+        try:
+            checksum = file_checksum(path)
         except FileNotFoundError:
-            self.stderr.write(self.style.ERROR(
-                f'File not found: {json_path}')
+            raise CommandError(f'File not found: {path}')
+        source = os.path.basename(path)
+        if not options['force'] and DatasetImport.objects.filter(
+            source=source, checksum=checksum
+        ).exists():
+            self.stdout.write(
+                f'Ingredients from {source} are up to date, skipped.'
             )
-
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(
-                f'Error loading ingredients: {e}')
+            return
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        with open(path, encoding='utf-8') as file:
+            rows = []
+            for row in reader(file):
+                if row not in existing:
+                    existing.add(row)
+                    rows.append(row)
+        with transaction.atomic():
+            if rows and connection.vendor == 'postgresql':
+                copy_ingredients(rows)
+            elif rows:
+                Ingredient.objects.bulk_create(
+                    (
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in rows
+                    ),
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=True,
+                )
+            DatasetImport.objects.update_or_create(
+                source=source, defaults={'checksum': checksum}
             )
+        if rows:
+            ingredients_loaded.send(sender=Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(rows)} new ingredients from {source} '
+            f'in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feeds from subscriptions and recent recipes'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} feed entries '
+            f'in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import index_recipes, remove_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of recipes'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            remove_recipes()
+            index_recipes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt in {time.perf_counter() - started:.2f}s.'
+        ))
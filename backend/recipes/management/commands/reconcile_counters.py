@@ -0,0 +1,12 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from foodgram_backend.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized counters that drifted from the data'
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile_counters(apps).items():
+            self.stdout.write(f'{counter}: {fixed} rows fixed')
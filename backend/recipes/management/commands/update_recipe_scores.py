@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.scores import recalculate_scores
+
+
+class Command(BaseCommand):
+    help = 'Recalculate popular and trending recipe scores'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = recalculate_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated scores of {changed} recipes '
+            f'in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes.short_links import encode_base62
+
+
+def fill_short_links(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = list(Recipe.objects.only('id'))
+    for recipe in recipes:
+        recipe.short_link = encode_base62(recipe.id)
+    Recipe.objects.bulk_update(recipes, ['short_link'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_datasetimport'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_short_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:32
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes.search import (
+    create_search_index,
+    drop_search_index,
+    index_recipes,
+)
+
+
+def build_search_index(apps, schema_editor):
+    create_search_index(schema_editor)
+    index_recipes(using=schema_editor.connection)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='Поисковый вектор')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+            },
+        ),
+        migrations.RunPython(build_search_index, remove_search_index),
+    ]
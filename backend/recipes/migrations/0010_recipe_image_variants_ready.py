@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:17
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+from api.images import variants_exist
+
+BATCH_SIZE = 1000
+
+
+def mark_ready_variants(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    names = [
+        name for name in Recipe.objects.order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        if variants_exist(name, default_storage)
+    ]
+    for start in range(0, len(names), BATCH_SIZE):
+        Recipe.objects.filter(
+            image__in=names[start:start + BATCH_SIZE]
+        ).update(image_variants_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feed_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Уменьшенные копии созданы'),
+        ),
+        migrations.RunPython(mark_ready_variants, migrations.RunPython.noop),
+    ]
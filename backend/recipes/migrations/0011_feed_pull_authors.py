@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_avatar_variants_ready'),
+        ('recipes', '0010_recipe_image_variants_ready'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedPullAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='users.user', verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Популярный автор ленты',
+                'verbose_name_plural': 'Популярные авторы ленты',
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
@@ -9,11 +10,14 @@ from foodgram_backend.constants import (
     TEXT_LENGTH_MAX,
     TEXT_LENGTH_MEDIUM,
     TEXT_LENGTH_MIN,
+    TRENDING_SCORE_MIN,
 )
+from foodgram_backend.counters import CounterFieldsMixin
+from recipes.short_links import encode_base62
 from users.models import User
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Рецепт."""
 
     author = models.ForeignKey(
@@ -25,6 +29,9 @@ class Recipe(models.Model):
         verbose_name='Ингредиенты'
     )
     image = models.ImageField('Изображение', upload_to='recipes/images/')
+    image_variants_ready = models.BooleanField(
+        'Уменьшенные копии созданы', default=False, editable=False
+    )
     name = models.CharField('Название', max_length=TEXT_LENGTH_MAX)
     text = models.TextField('Описание')
     cooking_time = models.PositiveSmallIntegerField(
@@ -45,16 +52,43 @@ class Recipe(models.Model):
         unique=True,
         null=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+
+    counter_fields = ('favorites_count', 'shopping_carts_count')
 
     class Meta:
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_at_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}. Автор: {self.author}'
 
+    def save(self, *args, **kwargs):
+        """Сохраняет рецепт и присваивает ему короткую ссылку."""
+        super().save(*args, **kwargs)
+        if not self.short_link:
+            self.short_link = encode_base62(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(
+                short_link=self.short_link
+            )
+
 
 class Ingredient(models.Model):
     """Ингредиент."""
@@ -127,6 +161,7 @@ class RecipesCollectionBase(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -167,3 +202,150 @@ class ShoppingCart(RecipesCollectionBase):
 
     def __str__(self):
         return f'Список покупок {self.user} для рецепта {self.recipe}'
+
+
+class RecipeScore(models.Model):
+    """Рейтинг рецепта по добавлениям в избранное и список покупок."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    popular = models.FloatField('Популярность за неделю', default=0)
+    trending = models.FloatField(
+        'Затухающий рейтинг', default=TRENDING_SCORE_MIN
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popular', '-recipe'],
+                name='recipe_score_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='recipe_score_trending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Рейтинг рецепта {self.recipe_id}'
+
+
+class RecipeSearchDocument(models.Model):
+    """Поисковый документ рецепта (PostgreSQL).
+
+    В SQLite вместо него используется виртуальная таблица FTS5.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Рецепт',
+    )
+    vector = SearchVectorField('Поисковый вектор', null=True)
+
+    class Meta:
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return f'Поисковый документ рецепта {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Строки добавляются при публикации рецепта для каждого подписчика
+    автора, поэтому лента читается по индексу без обхода подписок.
+    Автор и дата публикации копируются из рецепта.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                name='feed_entry_unique',
+                fields=['user', 'recipe'],
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-recipe'],
+                name='feed_entry_user_created_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
+
+
+class FeedPullAuthor(models.Model):
+    """Популярный автор, рецепты которого добавляются в ленты при чтении.
+
+    Для рецептов таких авторов строки FeedEntry не создаются. Автор
+    остается в таблице, пока его последние рецепты не скопированы
+    в ленты подписчиков, даже если подписчиков стало меньше порога.
+    """
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор ленты'
+        verbose_name_plural = 'Популярные авторы ленты'
+
+    def __str__(self):
+        return f'Автор {self.author_id} читается в ленты из рецептов'
+
+
+class DatasetImport(models.Model):
+    """Загруженный файл справочных данных."""
+
+    source = models.CharField('Файл', max_length=TEXT_LENGTH_MIN, unique=True)
+    checksum = models.CharField('Контрольная сумма', max_length=64)
+    loaded_at = models.DateTimeField('Дата загрузки', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Загрузка данных'
+        verbose_name_plural = 'Загрузки данных'
+
+    def __str__(self):
+        return f'{self.source} ({self.checksum})'
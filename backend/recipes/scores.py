@@ -0,0 +1,161 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils.timezone import now
+
+from foodgram_backend.constants import (
+    FAVORITE_SCORE_WEIGHT,
+    POPULAR_WINDOW_DAYS,
+    SHOPPING_CART_SCORE_WEIGHT,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_SCORE_MIN,
+)
+from recipes.models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+POPULAR_WINDOW = timedelta(days=POPULAR_WINDOW_DAYS)
+TRENDING_HORIZON = timedelta(hours=TRENDING_HALF_LIFE_HOURS * 40)
+WEIGHTS = {
+    Favorite: FAVORITE_SCORE_WEIGHT,
+    ShoppingCart: SHOPPING_CART_SCORE_WEIGHT,
+}
+BATCH_SIZE = 1000
+
+
+def event_value(weight, created_at):
+    """Возвращает вклад события в логарифмический рейтинг.
+
+    Рейтинг хранится как логарифм суммы весов событий, умноженных на
+    exp(DECAY_RATE * (t - EPOCH)). Затухание всех рецептов одинаково,
+    поэтому порядок по такому значению совпадает с порядком по сумме
+    затухших весов на любой момент, а значение не переполняется.
+    """
+    return math.log(weight) + DECAY_RATE * (
+        (created_at - EPOCH).total_seconds()
+    )
+
+
+def log_add(first, second):
+    """Логарифм суммы экспонент: ln(e^first + e^second)."""
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def add_event(model, recipe_id, created_at):
+    """Учитывает добавление рецепта в избранное или список покупок."""
+    add_events(model, [recipe_id], created_at)
+
+
+def add_events(model, recipe_ids, created_at):
+    """Учитывает пакет событий с одним временем одним запросом.
+
+    Каждый рецепт должен входить в пакет не больше одного раза.
+    """
+    weight = WEIGHTS[model]
+    value = Value(event_value(weight, created_at))
+    RecipeScore.objects.filter(recipe_id__in=recipe_ids).update(
+        popular=F('popular') + weight,
+        trending=Greatest(F('trending'), value) + Ln(
+            1 + Exp(-Abs(F('trending') - value))
+        ),
+    )
+
+
+def remove_event(model, recipe_id, created_at):
+    """Исключает событие из рейтинга при его удалении."""
+    remove_events(model, [(recipe_id, created_at)])
+
+
+def remove_events(model, events):
+    """Исключает пакет удаленных событий из рейтинга тремя запросами.
+
+    events — пары (id рецепта, время события), каждый рецепт должен
+    входить в пакет не больше одного раза.
+    """
+    weight = WEIGHTS[model]
+    window_start = now() - POPULAR_WINDOW
+    recent = [
+        recipe_id for recipe_id, created_at in events
+        if created_at >= window_start
+    ]
+    if recent:
+        RecipeScore.objects.filter(
+            recipe_id__in=recent, popular__gte=weight
+        ).update(popular=F('popular') - weight)
+    value = Case(
+        *(
+            When(
+                recipe_id=recipe_id,
+                then=Value(event_value(weight, created_at)),
+            )
+            for recipe_id, created_at in events
+        ),
+        output_field=FloatField(),
+    )
+    scores = RecipeScore.objects.filter(
+        recipe_id__in=[recipe_id for recipe_id, _ in events]
+    )
+    # Событие было единственным (или значение вышло за точность float):
+    # рейтинг возвращается к значению без событий.
+    scores.filter(trending__lte=value + 1e-9).update(
+        trending=TRENDING_SCORE_MIN
+    )
+    scores.filter(trending__gt=value + 1e-9).update(
+        trending=F('trending') + Ln(1 - Exp(value - F('trending')))
+    )
+
+
+def recalculate_scores(current=None, batch_size=BATCH_SIZE):
+    """Пересчитывает рейтинги всех рецептов по событиям.
+
+    Недельная популярность учитывает только события за последние
+    POPULAR_WINDOW_DAYS дней, поэтому пересчет нужно запускать
+    периодически. Возвращает число рецептов с измененным рейтингом.
+    """
+    current = current or now()
+    popular = {}
+    trending = {}
+    for model, weight in WEIGHTS.items():
+        events = model.objects.filter(
+            created_at__gte=current - TRENDING_HORIZON
+        ).values_list('recipe_id', 'created_at')
+        for recipe_id, created_at in events.iterator():
+            if created_at >= current - POPULAR_WINDOW:
+                popular[recipe_id] = popular.get(recipe_id, 0) + weight
+            value = event_value(weight, created_at)
+            trending[recipe_id] = (
+                log_add(trending[recipe_id], value)
+                if recipe_id in trending else value
+            )
+    RecipeScore.objects.bulk_create(
+        (
+            RecipeScore(recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.filter(
+                score__isnull=True
+            ).values_list('id', flat=True)
+        ),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    changed = [
+        RecipeScore(
+            recipe_id=recipe_id,
+            popular=popular.get(recipe_id, 0),
+            trending=trending.get(recipe_id, TRENDING_SCORE_MIN),
+        )
+        for recipe_id, old_popular, old_trending in (
+            RecipeScore.objects.values_list('recipe_id', 'popular', 'trending')
+            .iterator()
+        )
+        if not math.isclose(old_popular, popular.get(recipe_id, 0))
+        or not math.isclose(
+            old_trending, trending.get(recipe_id, TRENDING_SCORE_MIN)
+        )
+    ]
+    RecipeScore.objects.bulk_update(
+        changed, ('popular', 'trending'), batch_size=batch_size
+    )
+    return len(changed)
@@ -0,0 +1,152 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_INDEX = 'recipes_search_vector_idx'
+SEARCH_CONFIG = 'russian'
+FTS_WEIGHTS = '10.0, 4.0, 1.0'  # название, ингредиенты, описание
+WORD = re.compile(r'\w+')
+
+INGREDIENT_NAMES = {
+    'sqlite': "group_concat(ingredient.name, ' ')",
+    'postgresql': "string_agg(ingredient.name, ' ')",
+}
+DOCUMENTS_SQL = (
+    'SELECT recipe.id, recipe.name, COALESCE(('
+    'SELECT {names} FROM recipes_recipeingredient AS item '
+    'JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = item.ingredient_id '
+    "WHERE item.recipe_id = recipe.id), '') AS ingredients, recipe.text "
+    'FROM recipes_recipe AS recipe {where}'
+)
+SQLITE_INDEX_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) {{documents}}'
+)
+POSTGRESQL_INDEX_SQL = (
+    'INSERT INTO recipes_recipesearchdocument (recipe_id, vector) '
+    'SELECT id, '
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', ingredients), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', text), 'C') "
+    'FROM ({documents}) AS document WHERE true '
+    'ON CONFLICT (recipe_id) DO UPDATE SET vector = EXCLUDED.vector'
+)
+SQLITE_RANK_SQL = (
+    f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id'
+)
+
+
+def create_search_index(schema_editor):
+    """Создает полнотекстовый индекс, специфичный для СУБД.
+
+    В SQLite это виртуальная таблица FTS5, в PostgreSQL — GIN-индекс
+    по взвешенному tsvector таблицы RecipeSearchDocument.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(name, ingredients, text)'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} '
+            'ON recipes_recipesearchdocument USING gin (vector)'
+        )
+
+
+def drop_search_index(schema_editor):
+    """Удаляет полнотекстовый индекс."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+def index_recipes(recipe_ids=None, using=connection):
+    """Обновляет поисковые документы рецептов, при None — всех."""
+    if using.vendor not in INGREDIENT_NAMES:
+        return
+    where, params = '', []
+    if recipe_ids is not None:
+        params = list(recipe_ids)
+        if not params:
+            return
+        where = 'WHERE recipe.id IN ({})'.format(
+            ', '.join(['%s'] * len(params))
+        )
+    documents = DOCUMENTS_SQL.format(
+        names=INGREDIENT_NAMES[using.vendor], where=where
+    )
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            remove_recipes(recipe_ids, using)
+            cursor.execute(
+                SQLITE_INDEX_SQL.format(documents=documents), params
+            )
+        else:
+            cursor.execute(
+                POSTGRESQL_INDEX_SQL.format(documents=documents), params
+            )
+
+
+def remove_recipes(recipe_ids=None, using=connection):
+    """Удаляет документы рецептов из индекса FTS5.
+
+    В PostgreSQL документы удаляются каскадно вместе с рецептом.
+    """
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            return
+        recipe_ids = list(recipe_ids)
+        if recipe_ids:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{}})'.format(
+                    ', '.join(['%s'] * len(recipe_ids))
+                ),
+                recipe_ids,
+            )
+
+
+def fts_query(text):
+    """Преобразует текст в запрос FTS5: все слова как префиксы."""
+    return ' '.join(f'"{word}"*' for word in WORD.findall(text))
+
+
+def search_recipes(queryset, text):
+    """Фильтрует рецепты по поисковому запросу и добавляет search_rank.
+
+    Возвращает None, если запрос не содержит слов.
+    """
+    if not WORD.search(text):
+        return None
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_document__vector=query).annotate(
+            search_rank=SearchRank(F('search_document__vector'), query)
+        ).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        # bm25 считается коррелированным подзапросом к FTS5 только для
+        # найденных рецептов, queryset остается обычным и сочетается
+        # с фильтрами и условием курсора по search_rank.
+        query = fts_query(text)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (query,),
+        )).annotate(search_rank=RawSQL(
+            SQLITE_RANK_SQL, (query,), output_field=FloatField()
+        )).order_by('-search_rank', '-id')
+    return queryset.filter(name__icontains=text).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).order_by('-search_rank', '-id')
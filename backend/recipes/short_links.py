@@ -0,0 +1,15 @@
+from string import ascii_letters, digits
+
+ALPHABET = digits + ascii_letters
+BASE = len(ALPHABET)
+
+
+def encode_base62(number):
+    """Кодирует неотрицательное число в строку base62."""
+    if number == 0:
+        return ALPHABET[0]
+    chars = []
+    while number:
+        number, remainder = divmod(number, BASE)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+# Отправляется после изменения состава рецепта.
+# Аргументы: recipe_id и ingredient_ids (None, если состав нужно прочитать).
+recipe_ingredients_changed = Signal()
+
+# Отправляется после загрузки справочника ингредиентов из файла.
+ingredients_loaded = Signal()
+
+# Отправляется после пакетной вставки записей через bulk_create,
+# которая не отправляет post_save. Аргументы: objs — новые записи.
+bulk_created = Signal()
+
+# Отправляется после пакетного удаления записей без pre_delete
+# и post_delete. Аргументы: objs — удаленные записи.
+bulk_deleted = Signal()
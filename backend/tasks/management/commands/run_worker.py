@@ -0,0 +1,48 @@
+import signal
+
+from django.conf import settings
+from django.core import checks
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+
+from tasks.queue import Worker, registry
+
+
+class Command(BaseCommand):
+    help = 'Process background tasks from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help='Number of tasks processed in parallel'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        # Задачи сбрасывают кеши веб-процессов через счетчики версий,
+        # поэтому предупреждаем, если кеш не общий для процессов.
+        for message in checks.run_checks(
+            tags=[checks.Tags.caches], include_deployment_checks=True
+        ):
+            self.stderr.write(self.style.WARNING(str(message)))
+        worker = Worker(options['concurrency'], options['poll_interval'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(
+            f'Worker started with concurrency {options["concurrency"]}, '
+            f'{len(registry)} tasks registered.'
+        )
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker stopped, {worker.processed} tasks processed.'
+        ))
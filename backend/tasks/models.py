@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils.timezone import now
+
+from foodgram_backend.constants import TEXT_LENGTH_MAX
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди.
+
+    Задача создается в транзакции запроса и становится видна
+    обработчику только после ее фиксации. Выполненные задачи
+    удаляются, упавшие после всех попыток остаются со статусом failed.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=TEXT_LENGTH_MAX)
+    args = models.JSONField('Аргументы', default=list)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    run_at = models.DateTimeField('Выполнить после', default=now)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_at', 'id')
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at', 'id'],
+                name='task_status_run_at_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)} ({self.status})'
@@ -0,0 +1,181 @@
+import functools
+import logging
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class BackgroundTask:
+    """Функция, которую можно поставить в очередь методом delay."""
+
+    def __init__(self, function, max_attempts):
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.name = f'{function.__module__}.{function.__name__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+    def run_eager(self, *args):
+        """Выполняет задачу в текущем процессе, не прерывая ответ."""
+        try:
+            self.function(*args)
+        except Exception:
+            logger.exception('Task %s failed', self.name)
+
+    def delay(self, *args):
+        """Ставит задачу в очередь в текущей транзакции.
+
+        Обработчик увидит задачу только после фиксации транзакции.
+        При TASKS_EAGER задача выполняется в этом процессе сразу
+        после фиксации без повторов. Аргументы должны сериализоваться в JSON.
+        """
+        if settings.TASKS_EAGER:
+            transaction.on_commit(lambda: self.run_eager(*args))
+            return None
+        return Task.objects.create(name=self.name, args=list(args))
+
+
+def task(max_attempts=None):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(function):
+        background_task = BackgroundTask(
+            function, max_attempts or settings.TASK_MAX_ATTEMPTS
+        )
+        registry[background_task.name] = background_task
+        return background_task
+
+    return decorator
+
+
+def ready_condition():
+    """Условие для задач, которые можно взять в работу.
+
+    Задача, зависшая в статусе running дольше TASK_LOCK_TIMEOUT,
+    считается брошенной упавшим обработчиком и выполняется заново.
+    """
+    current = now()
+    return Q(status=Task.PENDING, run_at__lte=current) | Q(
+        status=Task.RUNNING,
+        locked_at__lt=current - timedelta(seconds=settings.TASK_LOCK_TIMEOUT),
+    )
+
+
+def claim(limit):
+    """Забирает до limit готовых задач.
+
+    Задача переводится в running условным UPDATE, поэтому несколько
+    обработчиков не возьмут одну задачу и без блокировок строк.
+    """
+    condition = ready_condition()
+    candidates = Task.objects.filter(condition).values_list(
+        'id', flat=True
+    )[:limit * 2]
+    claimed = []
+    for task_id in candidates:
+        if Task.objects.filter(condition, id=task_id).update(
+            status=Task.RUNNING,
+            locked_at=now(),
+            attempts=F('attempts') + 1,
+        ):
+            claimed.append(task_id)
+            if len(claimed) == limit:
+                break
+    return list(Task.objects.filter(id__in=claimed))
+
+
+def execute(task):
+    """Выполняет задачу и удаляет ее, при ошибке планирует повтор.
+
+    Повторы откладываются экспоненциально от TASK_RETRY_DELAY,
+    после max_attempts попыток задача получает статус failed.
+    """
+    close_old_connections()
+    background_task = registry.get(task.name)
+    try:
+        if background_task is None:
+            raise LookupError(f'Unknown task {task.name}')
+        background_task.function(*task.args)
+    except Exception:
+        logger.exception('Task %s %s failed', task.id, task.name)
+        queryset = Task.objects.filter(id=task.id)
+        error = traceback.format_exc()
+        if background_task is None or (
+            task.attempts >= background_task.max_attempts
+        ):
+            queryset.update(
+                status=Task.FAILED, locked_at=None, last_error=error
+            )
+        else:
+            queryset.update(
+                status=Task.PENDING,
+                locked_at=None,
+                last_error=error,
+                run_at=now() + timedelta(
+                    seconds=settings.TASK_RETRY_DELAY
+                    * 2 ** (task.attempts - 1)
+                ),
+            )
+        return False
+    else:
+        Task.objects.filter(id=task.id).delete()
+        return True
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """Обработчик очереди: забирает задачи и выполняет их в пуле потоков."""
+
+    def __init__(self, concurrency, poll_interval):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.processed = 0
+
+    def stop(self, *args):
+        """Останавливает обработчик после завершения текущих задач."""
+        self.stopping.set()
+
+    def run(self, burst=False):
+        """Обрабатывает очередь до остановки.
+
+        При burst обработчик завершается, когда очередь опустела.
+        """
+        running = set()
+        with ThreadPoolExecutor(
+            self.concurrency, thread_name_prefix='task'
+        ) as executor:
+            while not self.stopping.is_set():
+                close_old_connections()
+                free = self.concurrency - len(running)
+                tasks = claim(free) if free else []
+                for task in tasks:
+                    running.add(executor.submit(execute, task))
+                if not tasks and not running:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                done, running = wait(
+                    running,
+                    timeout=self.poll_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+                self.processed += len(done)
+            done, _ = wait(running)
+            self.processed += len(done)
+        close_old_connections()
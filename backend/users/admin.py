@@ -22,13 +22,17 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_active', 'is_superuser')
     search_fields = ('username', 'first_name', 'last_name', 'email')
 
-    @admin.display(description='Сколько подписчиков')
+    @admin.display(
+        description='Сколько подписчиков', ordering='subscribers_count'
+    )
     def get_subscribers(self, object):
-        return object.authors.count()
+        return object.subscribers_count
 
-    @admin.display(description='Сколько рецептов')
+    @admin.display(
+        description='Сколько рецептов', ordering='recipes_count'
+    )
     def get_recipes(self, object):
-        return object.recipes.count()
+        return object.recipes_count
 
 
 @admin.register(Subscription)
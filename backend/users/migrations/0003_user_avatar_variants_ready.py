@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:17
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+from api.images import variants_exist
+
+BATCH_SIZE = 1000
+
+
+def mark_ready_variants(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    names = [
+        name for name in User.objects.order_by().values_list(
+            'avatar', flat=True
+        ).distinct()
+        if variants_exist(name, default_storage)
+    ]
+    for start in range(0, len(names), BATCH_SIZE):
+        User.objects.filter(
+            avatar__in=names[start:start + BATCH_SIZE]
+        ).update(avatar_variants_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Уменьшенные копии созданы'),
+        ),
+        migrations.RunPython(mark_ready_variants, migrations.RunPython.noop),
+    ]
@@ -4,10 +4,11 @@ from django.core.validators import RegexValidator
 from django.db import models
 
 from foodgram_backend.constants import TEXT_LENGTH_MAX, TEXT_LENGTH_MEDIUM
+from foodgram_backend.counters import CounterFieldsMixin
 from users.manager import UserManager
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     """Кастомный пользователь системы."""
 
     first_name = models.CharField(
@@ -47,9 +48,19 @@ class User(AbstractUser):
         unique=True
     )
     avatar = models.ImageField('Аватар', upload_to='users/')
+    avatar_variants_ready = models.BooleanField(
+        'Уменьшенные копии созданы', default=False, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0, editable=False
+    )
 
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username', 'password']
     USERNAME_FIELD = 'email'
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     objects = UserManager()
 